@@ -13,7 +13,13 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-import asyncio, json, sqlite3, os, re, time, random, traceback
+import asyncio, json, sqlite3, os, sys, re, time, random, traceback, threading, queue, uuid
+import subprocess, zlib, multiprocessing, hashlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+import urllib.robotparser
+import xml.etree.ElementTree as ET
 from datetime import datetime
 from urllib.parse import urlparse, urljoin
 from collections import Counter
@@ -24,7 +30,6 @@ import plotly.graph_objects as go
 # ── Optional imports (graceful degradation) ───────────────────────────────────
 try:
     import trafilatura
-    from bs4 import BeautifulSoup
     HAS_CRAWL = True
 except ImportError:
     HAS_CRAWL = False
@@ -41,15 +46,30 @@ try:
 except ImportError:
     HAS_PLAYWRIGHT = False
 
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+try:
+    import h2  # noqa: F401 — enables HTTP/2 in httpx
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
+
 try:
     import boto3
+    from botocore.config import Config as BotoConfig
     HAS_BEDROCK = True
 except ImportError:
     HAS_BEDROCK = False
 
 
 # ── Constants ─────────────────────────────────────────────────────────────────
-DB_PATH   = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyses.db")
+DB_PATH   = os.environ.get("AICLAW_DB") or \
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyses.db")
+QUERY_MODE = os.environ.get("AICLAW_QUERY_MODE", "local")   # "local" | "distributed"
 MODELS         = ["Gemini", "Claude"]       # ChatGPT skipped — Cloudflare blocks headless
 MODELS_ALL     = ["Perplexity", "Gemini", "Claude"]  # full list for display/charts
 CHATGPT_SKIP   = True
@@ -277,6 +297,99 @@ def init_db():
             score REAL NOT NULL,
             json_data TEXT NOT NULL
         )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS jobs(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created TEXT NOT NULL,
+            updated TEXT NOT NULL,
+            status TEXT NOT NULL,
+            params_json TEXT NOT NULL,
+            worker TEXT,
+            run_id TEXT,
+            progress REAL NOT NULL DEFAULT 0,
+            log_json TEXT NOT NULL DEFAULT '[]',
+            result_json TEXT,
+            error TEXT
+        )""")
+        try:
+            conn.execute("ALTER TABLE jobs ADD COLUMN partial_json TEXT")
+        except sqlite3.OperationalError:
+            pass    # already migrated
+        conn.execute("""CREATE TABLE IF NOT EXISTS work_items(
+            run_id TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt TEXT NOT NULL,
+            prompt_idx INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            context_json TEXT NOT NULL,
+            PRIMARY KEY(run_id, model, prompt)
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS runs(
+            run_id TEXT PRIMARY KEY,
+            created TEXT NOT NULL,
+            updated TEXT NOT NULL,
+            url TEXT NOT NULL,
+            brand TEXT NOT NULL,
+            status TEXT NOT NULL,
+            params_json TEXT NOT NULL,
+            intel_json TEXT NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS query_results(
+            run_id TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            json_data TEXT NOT NULL,
+            PRIMARY KEY(run_id, model, prompt)
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS selector_stats(
+            model TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            selector TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0,
+            total_ms REAL NOT NULL DEFAULT 0,
+            updated TEXT NOT NULL,
+            PRIMARY KEY(model, kind, selector)
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS crawl_cache(
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body BLOB NOT NULL,
+            text TEXT,
+            size INTEGER NOT NULL,
+            fetched REAL NOT NULL,
+            used REAL NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS bedrock_cache(
+            key TEXT PRIMARY KEY,
+            model_id TEXT NOT NULL,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            used REAL NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS answer_cache(
+            model TEXT NOT NULL,
+            prompt_key TEXT NOT NULL,
+            country TEXT NOT NULL,
+            json_data TEXT NOT NULL,
+            created REAL NOT NULL,
+            PRIMARY KEY(model, prompt_key, country)
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS limiter_state(
+            model TEXT PRIMARY KEY,
+            rate REAL NOT NULL,
+            backoff_level INTEGER NOT NULL,
+            updated TEXT NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS provider_slots(
+            model TEXT PRIMARY KEY,
+            next_at REAL NOT NULL
+        )""")
         conn.commit(); conn.close()
     except Exception:
         pass  # Read-only filesystem on Streamlit Cloud — silently skip
@@ -292,6 +405,495 @@ def save_analysis(url, brand, score, data):
     except Exception:
         pass  # Read-only filesystem on Streamlit Cloud — silently skip
 
+def submit_job(params: dict) -> int | None:
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        now = datetime.now().isoformat()
+        cur = conn.execute(
+            "INSERT INTO jobs(created,updated,status,params_json) VALUES(?,?,?,?)",
+            (now, now, "queued", json.dumps(params))
+        )
+        conn.commit(); conn.close()
+        return cur.lastrowid
+    except Exception:
+        return None
+
+def claim_job(worker: str, stale_s: float) -> dict | None:
+    """Atomically take the oldest queued job (or one whose worker went silent)."""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("BEGIN IMMEDIATE")
+        stale = datetime.fromtimestamp(time.time() - stale_s).isoformat()
+        row = conn.execute(
+            """SELECT id FROM jobs WHERE status='queued'
+                  OR (status='running' AND updated < ?) ORDER BY id LIMIT 1""", (stale,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT"); conn.close()
+            return None
+        conn.execute("UPDATE jobs SET status='running', worker=?, updated=? WHERE id=?",
+                     (worker, datetime.now().isoformat(), row[0]))
+        conn.execute("COMMIT"); conn.close()
+        return load_job(row[0])
+    except Exception:
+        return None
+
+def cancel_job(job_id: int) -> bool:
+    """Withdraw a job no worker has claimed yet; False if one already has."""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        cur = conn.execute("UPDATE jobs SET status='cancelled', updated=? "
+                           "WHERE id=? AND status='queued'",
+                           (datetime.now().isoformat(), job_id))
+        conn.commit(); conn.close()
+        return cur.rowcount > 0
+    except Exception:
+        return True
+
+def update_job(job_id: int, **fields):
+    """Heartbeat + progress: any of progress=, log=, run_id=, partial=."""
+    cols = {"progress": "progress", "log": "log_json", "run_id": "run_id",
+            "partial": "partial_json"}
+    sets, vals = ["updated=?"], [datetime.now().isoformat()]
+    for k, v in fields.items():
+        sets.append(f"{cols[k]}=?")
+        vals.append(json.dumps(v, default=str) if k in ("log", "partial") else v)
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute(f"UPDATE jobs SET {','.join(sets)} WHERE id=?", (*vals, job_id))
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def finish_job(job_id: int, result: dict | None, error: str | None = None):
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute(
+            "UPDATE jobs SET status=?, updated=?, progress=?, result_json=?, error=? WHERE id=?",
+            ("failed" if error else "done", datetime.now().isoformat(), 1.0,
+             json.dumps(result, default=str) if result is not None else None, error, job_id)
+        )
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def load_job(job_id: int) -> dict | None:
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        row = conn.execute(
+            """SELECT id,status,params_json,worker,run_id,progress,log_json,result_json,error,
+                      partial_json
+               FROM jobs WHERE id=?""", (job_id,)
+        ).fetchone()
+        conn.close()
+        if not row:
+            return None
+        return {"id": row[0], "status": row[1], "params": json.loads(row[2]),
+                "worker": row[3], "run_id": row[4], "progress": row[5],
+                "log": json.loads(row[6] or "[]"),
+                "result": json.loads(row[7]) if row[7] else None, "error": row[8],
+                "partial": json.loads(row[9]) if row[9] else None}
+    except Exception:
+        return None
+
+def enqueue_work_items(run_id: str, prompts: list, models: list, context: dict,
+                       skip: set = frozenset()) -> int:
+    """One (run_id, model, prompt) cell per row; `context` carries brand/domain/
+    competitors so any worker can build the raw result. Cells a live worker
+    still holds a lease on are left alone. Returns cells queued."""
+    now  = time.time()
+    rows = [(run_id, m, p, i, "queued", json.dumps(context), now)
+            for m in models for i, p in enumerate(prompts) if (m, p) not in skip]
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        cur = conn.executemany(
+            """INSERT INTO work_items(run_id,model,prompt,prompt_idx,status,context_json)
+               VALUES(?,?,?,?,?,?)
+               ON CONFLICT(run_id,model,prompt) DO UPDATE SET
+                 prompt_idx=excluded.prompt_idx, status='queued', lease_owner=NULL,
+                 lease_expires=0, attempts=0, context_json=excluded.context_json
+               WHERE NOT (work_items.status='leased' AND work_items.lease_expires >= ?)""",
+            rows
+        )
+        conn.commit(); conn.close()
+        return cur.rowcount
+    except Exception:
+        return 0
+
+def claim_work_item(owner: str, lease_s: float, models: list | None = None,
+                    max_attempts: int = 3) -> dict | None:
+    """Lease the next queued cell (or one whose lease expired). Cells that have
+    been leased `max_attempts` times are failed instead of retried forever."""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        model_sql = f" AND model IN ({','.join('?' * len(models))})" if models else ""
+        row = conn.execute(
+            f"""SELECT run_id,model,prompt,attempts,context_json FROM work_items
+                WHERE (status='queued' OR (status='leased' AND lease_expires < ?)){model_sql}
+                ORDER BY attempts, prompt_idx, run_id LIMIT 1""",
+            (now, *(models or []))
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT"); conn.close()
+            return None
+        run_id, model, prompt, attempts, ctx = row
+        status = "leased" if attempts < max_attempts else "failed"
+        conn.execute(
+            """UPDATE work_items SET status=?, lease_owner=?, lease_expires=?, attempts=attempts+1
+               WHERE run_id=? AND model=? AND prompt=?""",
+            (status, owner, now + lease_s, run_id, model, prompt)
+        )
+        conn.execute("COMMIT"); conn.close()
+        return {"run_id": run_id, "model": model, "prompt": prompt,
+                "attempts": attempts + 1, "failed": status == "failed", **json.loads(ctx)}
+    except Exception:
+        return None
+
+def heartbeat_work_item(item: dict, owner: str, lease_s: float) -> bool:
+    """Extend our lease; False if another worker has taken the cell over."""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        cur = conn.execute(
+            """UPDATE work_items SET lease_expires=?
+               WHERE run_id=? AND model=? AND prompt=? AND lease_owner=? AND status='leased'""",
+            (time.time() + lease_s, item["run_id"], item["model"], item["prompt"], owner)
+        )
+        conn.commit(); conn.close()
+        return cur.rowcount == 1
+    except Exception:
+        return False
+
+def complete_work_item(item: dict, res: dict):
+    save_raw_result(item["run_id"], res)
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute(
+            "UPDATE work_items SET status='done' WHERE run_id=? AND model=? AND prompt=?",
+            (item["run_id"], item["model"], item["prompt"])
+        )
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def work_progress(run_id: str, cells: set | None = None) -> tuple[int, int]:
+    """(finished cells, total cells) for a run, counting only the
+    {(model, prompt)} `cells` when given."""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        rows = conn.execute(
+            "SELECT model,prompt,status FROM work_items WHERE run_id=?", (run_id,)
+        ).fetchall()
+        conn.close()
+    except Exception:
+        return 0, 0
+    if cells is not None:
+        rows = [r for r in rows if (r[0], r[1]) in cells]
+    return sum(1 for r in rows if r[2] in ("done", "failed")), len(rows)
+
+def new_run_id() -> str:
+    return datetime.now().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+def save_run(run_id: str, url: str, intel: dict, params: dict, status="running"):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        now = datetime.now().isoformat()
+        conn.execute(
+            """INSERT INTO runs(run_id,created,updated,url,brand,status,params_json,intel_json)
+               VALUES(?,?,?,?,?,?,?,?)
+               ON CONFLICT(run_id) DO UPDATE SET updated=excluded.updated,
+                 status=excluded.status, intel_json=excluded.intel_json""",
+            (run_id, now, now, url, intel.get("brand", ""), status,
+             json.dumps(params), json.dumps(intel, default=str))
+        )
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def update_run_intel(run_id: str, intel: dict):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("UPDATE runs SET intel_json=?, updated=? WHERE run_id=?",
+                     (json.dumps(intel, default=str), datetime.now().isoformat(), run_id))
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def set_run_status(run_id: str, status: str):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("UPDATE runs SET status=?, updated=? WHERE run_id=?",
+                     (status, datetime.now().isoformat(), run_id))
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def load_run(run_id: str) -> dict | None:
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        row = conn.execute(
+            "SELECT url,status,params_json,intel_json FROM runs WHERE run_id=?", (run_id,)
+        ).fetchone()
+        conn.close()
+        if not row:
+            return None
+        return {"run_id": run_id, "url": row[0], "status": row[1],
+                "params": json.loads(row[2]), "intel": json.loads(row[3])}
+    except Exception:
+        return None
+
+def load_resumable_runs(n=5, idle_s=120):
+    """Unfinished runs with no checkpoint for `idle_s` seconds (i.e. not still
+    progressing in some other session): (run_id, created, brand, cells_done)."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cutoff = datetime.fromtimestamp(time.time() - idle_s).isoformat()
+        rows = conn.execute(
+            """SELECT r.run_id, r.created, r.brand,
+                      (SELECT COUNT(*) FROM query_results q WHERE q.run_id=r.run_id)
+               FROM runs r WHERE r.status='running' AND r.updated < ?
+               ORDER BY r.created DESC LIMIT ?""", (cutoff, n)
+        ).fetchall()
+        conn.close(); return rows
+    except Exception:
+        return []
+
+def save_raw_result(run_id: str, res: dict):
+    """Checkpoint one raw query result (idempotent per run/model/prompt)."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        now = datetime.now().isoformat()
+        conn.execute(
+            "INSERT OR REPLACE INTO query_results(run_id,model,prompt,timestamp,json_data) VALUES(?,?,?,?,?)",
+            (run_id, res["model"], res["prompt"], now, json.dumps(res, default=str))
+        )
+        conn.execute("UPDATE runs SET updated=? WHERE run_id=?", (now, run_id))
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def load_raw_results(run_id: str) -> list:
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        rows = conn.execute(
+            "SELECT json_data FROM query_results WHERE run_id=? ORDER BY timestamp", (run_id,)
+        ).fetchall()
+        conn.close()
+        return [json.loads(r[0]) for r in rows]
+    except Exception:
+        return []
+
+def load_limiter_state(model: str) -> dict | None:
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        row = conn.execute(
+            "SELECT rate,backoff_level FROM limiter_state WHERE model=?", (model,)
+        ).fetchone()
+        conn.close()
+        return {"rate": row[0], "backoff_level": row[1]} if row else None
+    except Exception:
+        return None
+
+def save_limiter_state(model: str, rate: float, backoff_level: int):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute(
+            "INSERT OR REPLACE INTO limiter_state(model,rate,backoff_level,updated) VALUES(?,?,?,?)",
+            (model, rate, backoff_level, datetime.now().isoformat())
+        )
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def claim_provider_slot(model: str, earliest: float, gap: float) -> float:
+    """Reserve the next query start for `model` across every process sharing
+    this DB: returns max(earliest, the next free slot) as a wall-clock time
+    and moves the free slot `gap` seconds past it."""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT next_at FROM provider_slots WHERE model=?",
+                           (model,)).fetchone()
+        start = max(earliest, row[0] if row else 0.0)
+        conn.execute("INSERT OR REPLACE INTO provider_slots(model,next_at) VALUES(?,?)",
+                     (model, start + gap))
+        conn.execute("COMMIT"); conn.close()
+        return start
+    except Exception:
+        return earliest
+
+def hold_provider_slot(model: str, until: float):
+    """Push the next free slot for `model` to at least `until` (wall clock)."""
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute(
+            """INSERT INTO provider_slots(model,next_at) VALUES(?,?)
+               ON CONFLICT(model) DO UPDATE SET next_at=MAX(next_at, excluded.next_at)""",
+            (model, until))
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def load_selector_stats(model: str) -> dict:
+    """{(kind, selector): (hits, misses, total_ms)} for one provider."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        rows = conn.execute(
+            "SELECT kind,selector,hits,misses,total_ms FROM selector_stats WHERE model=?", (model,)
+        ).fetchall()
+        conn.close()
+        return {(k, s): (h, m, t) for k, s, h, m, t in rows}
+    except Exception:
+        return {}
+
+def save_selector_stats(model: str, kind: str, hit, hit_ms: float, misses: list):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        now = datetime.now().isoformat()
+        rows = ([(model, kind, hit, 1, 0, hit_ms, now)] if hit else []) + \
+               [(model, kind, s, 0, 1, 0.0, now) for s in misses]
+        conn.executemany(
+            """INSERT INTO selector_stats(model,kind,selector,hits,misses,total_ms,updated)
+               VALUES(?,?,?,?,?,?,?)
+               ON CONFLICT(model,kind,selector) DO UPDATE SET
+                 hits=hits+excluded.hits, misses=misses+excluded.misses,
+                 total_ms=total_ms+excluded.total_ms, updated=excluded.updated""",
+            rows
+        )
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def load_crawl_cache(url: str) -> dict | None:
+    """Cached page for `url` (marks it used for LRU eviction)."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        row = conn.execute(
+            "SELECT etag,last_modified,body,text,fetched FROM crawl_cache WHERE url=?", (url,)
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE crawl_cache SET used=? WHERE url=?", (time.time(), url))
+            conn.commit()
+        conn.close()
+        if not row:
+            return None
+        return {"etag": row[0], "last_modified": row[1],
+                "html": zlib.decompress(row[2]).decode("utf-8", "replace"),
+                "text": row[3], "fetched": row[4]}
+    except Exception:
+        return None
+
+def save_crawl_cache(url: str, etag, last_modified, html: str, text: str | None):
+    try:
+        body = zlib.compress(html.encode("utf-8"))
+        now  = time.time()
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute(
+            """INSERT OR REPLACE INTO crawl_cache(url,etag,last_modified,body,text,size,fetched,used)
+               VALUES(?,?,?,?,?,?,?,?)""",
+            (url, etag, last_modified, body, text, len(body) + len(text or ""), now, now)
+        )
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def touch_crawl_cache(url: str):
+    """A 304 revalidated the entry — restart its TTL."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("UPDATE crawl_cache SET fetched=?, used=? WHERE url=?",
+                     (time.time(), time.time(), url))
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def evict_crawl_cache(max_bytes: int | None = None):
+    """Drop least recently used pages until the cache fits in `max_bytes`."""
+    max_bytes = CRAWL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        total = conn.execute("SELECT COALESCE(SUM(size),0) FROM crawl_cache").fetchone()[0]
+        if total > max_bytes:
+            drop = []
+            for url, size in conn.execute("SELECT url,size FROM crawl_cache ORDER BY used"):
+                if total <= max_bytes:
+                    break
+                drop.append((url,)); total -= size
+            conn.executemany("DELETE FROM crawl_cache WHERE url=?", drop)
+            conn.commit()
+        conn.close()
+    except Exception:
+        pass
+
+def load_bedrock_cache(key: str, ttl_s: float) -> str | None:
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        row = conn.execute(
+            "SELECT response FROM bedrock_cache WHERE key=? AND created>?", (key, time.time() - ttl_s)
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE bedrock_cache SET used=? WHERE key=?", (time.time(), key))
+            conn.commit()
+        conn.close()
+        return row[0] if row else None
+    except Exception:
+        return None
+
+def save_bedrock_cache(key: str, model_id: str, response: str):
+    try:
+        now  = time.time()
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute(
+            "INSERT OR REPLACE INTO bedrock_cache(key,model_id,response,size,created,used) VALUES(?,?,?,?,?,?)",
+            (key, model_id, response, len(response), now, now)
+        )
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
+def evict_bedrock_cache(max_bytes: int):
+    """Least recently used responses go first once the table exceeds `max_bytes`."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        total = conn.execute("SELECT COALESCE(SUM(size),0) FROM bedrock_cache").fetchone()[0]
+        if total > max_bytes:
+            drop = []
+            for key, size in conn.execute("SELECT key,size FROM bedrock_cache ORDER BY used"):
+                if total <= max_bytes:
+                    break
+                drop.append((key,)); total -= size
+            conn.executemany("DELETE FROM bedrock_cache WHERE key=?", drop)
+            conn.commit()
+        conn.close()
+    except Exception:
+        pass
+
+def load_answer(model: str, prompt_key: str, country: str, max_age_s: float):
+    """(raw result, age in seconds) for a fresh cached answer, else None."""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        row = conn.execute(
+            """SELECT json_data,created FROM answer_cache
+               WHERE model=? AND prompt_key=? AND country=? AND created>?""",
+            (model, prompt_key, country, time.time() - max_age_s)
+        ).fetchone()
+        conn.close()
+        return (json.loads(row[0]), time.time() - row[1]) if row else None
+    except Exception:
+        return None
+
+def save_answer(model: str, prompt_key: str, country: str, res: dict):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute(
+            "INSERT OR REPLACE INTO answer_cache(model,prompt_key,country,json_data,created) VALUES(?,?,?,?,?)",
+            (model, prompt_key, country, json.dumps(res, default=str), time.time())
+        )
+        conn.commit(); conn.close()
+    except Exception:
+        pass
+
 def load_recent(n=5):
     try:
         conn = sqlite3.connect(DB_PATH)
@@ -322,33 +924,362 @@ def extract_domain(url: str) -> str:
 def brand_from_domain(domain: str) -> str:
     return domain.split(".")[0].replace("-"," ").replace("_"," ").title()
 
-def crawl_site(url: str, log) -> str:
-    """Fetch homepage + up to 3 internal links via trafilatura."""
+CRAWL_PAGES       = int(os.environ.get("AICLAW_CRAWL_PAGES", "3"))  # internal pages after the homepage
+CRAWL_REQ_TIMEOUT = 8.0          # seconds per request
+CRAWL_BUDGET_S    = 20.0         # seconds for the whole crawl
+CRAWL_MAX_BYTES   = 2_000_000    # response bodies are cut off past this
+CRAWL_CONCURRENCY = 4
+CRAWL_CACHE_TTL_S     = 6 * 3600      # cached pages younger than this skip the network
+CRAWL_CACHE_MAX_BYTES = 64 * 2**20    # least recently used pages are evicted past this
+CRAWL_UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+class _LinkCollector(HTMLParser):
+    """Incremental <a href> collector: same-domain, query-free, normalised
+    (no fragment, lower-case host) and deduped as tags stream past. Sets
+    `done` once `limit` links are found so the caller can stop feeding."""
+    def __init__(self, url: str, limit: int):
+        super().__init__(convert_charrefs=False)
+        self.base_url, self.base, self.limit = url, extract_domain(url), limit
+        self.links, self.seen, self.done = [], {url.split("#", 1)[0]}, False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "base":
+            href = dict(attrs).get("href")
+            if href:
+                self.base_url = urljoin(self.base_url, href)
+            return
+        if tag != "a" or self.done:
+            return
+        href = dict(attrs).get("href")
+        if not href or href.startswith(("#", "mailto:", "tel:", "javascript:")):
+            return
+        p = urlparse(urljoin(self.base_url, href.strip()))
+        if p.scheme not in ("http", "https") or p.query:
+            return
+        full = p._replace(netloc=p.netloc.lower(), fragment="").geturl()
+        if full in self.seen or extract_domain(full) != self.base:
+            return
+        self.seen.add(full)
+        self.links.append(full)
+        self.done = len(self.links) >= self.limit
+
+LINK_FEED_CHUNK  = 16_384
+HOME_LINK_LIMIT  = 60        # homepage links considered for the crawl frontier
+
+def _internal_links(html: str, url: str, limit: int) -> list:
+    """Same-domain, query-free links from a page, in document order. Tokenises
+    in chunks and stops as soon as `limit` links are found."""
+    lc = _LinkCollector(url, limit)
+    try:
+        for i in range(0, len(html), LINK_FEED_CHUNK):
+            lc.feed(html[i:i + LINK_FEED_CHUNK])
+            if lc.done:
+                break
+    except Exception:
+        pass    # malformed markup — keep what was collected
+    return lc.links
+
+async def _fetch_capped(client, url: str, deadline: float, headers: dict | None = None,
+                        stats: Counter | None = None) -> tuple[int, dict, str | None]:
+    """GET `url` within the crawl deadline, reading at most CRAWL_MAX_BYTES.
+    Bytes read are added to stats["bytes"] as they arrive. Returns
+    (status, response headers, html or None)."""
+    left = deadline - time.monotonic()
+    if left <= 0:
+        return 0, {}, None
+    async def _get():
+        async with client.stream("GET", url, headers=headers) as resp:
+            if resp.status_code >= 300 or "html" not in resp.headers.get("content-type", "html"):
+                return resp.status_code, resp.headers, None
+            buf = bytearray()
+            async for chunk in resp.aiter_bytes():
+                buf += chunk
+                if stats is not None:
+                    stats["bytes"] += len(chunk)
+                if len(buf) >= CRAWL_MAX_BYTES:
+                    break
+            html = bytes(buf[:CRAWL_MAX_BYTES]).decode(resp.encoding or "utf-8", "replace")
+            return resp.status_code, resp.headers, html
+    return await asyncio.wait_for(_get(), min(left, CRAWL_REQ_TIMEOUT))
+
+EXTRACT_WORKERS = int(os.environ.get("AICLAW_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+
+class ExtractPool:
+    """trafilatura.extract in worker processes. At most 2× workers pages are
+    queued; callers wait for a slot, so fetching keeps going while earlier
+    pages are extracted without piling HTML up in memory."""
+
+    def __init__(self, workers: int = EXTRACT_WORKERS):
+        self.workers = max(1, workers)
+        self.slots   = threading.BoundedSemaphore(self.workers * 2)
+        self._lock   = threading.Lock()
+        self._pool   = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=ctx)
+            return self._pool
+
+    async def _take_slot(self):
+        """Acquire a slot in a worker thread. If the caller is cancelled while
+        waiting, the slot is handed back as soon as the thread gets it."""
+        state = {"cancelled": False, "held": False}
+        guard = threading.Lock()
+        def take():
+            self.slots.acquire()
+            with guard:
+                if state["cancelled"]:
+                    self.slots.release()
+                else:
+                    state["held"] = True
+        try:
+            await asyncio.to_thread(take)
+        except BaseException:
+            with guard:
+                state["cancelled"] = True
+                if state["held"]:
+                    self.slots.release()
+            raise
+
+    async def extract(self, html: str, **kw) -> str | None:
+        await self._take_slot()
+        try:
+            return await asyncio.wrap_future(self._executor().submit(trafilatura.extract, html, **kw))
+        except BrokenProcessPool:
+            with self._lock:
+                self._pool = None       # rebuilt on next call
+            return await asyncio.to_thread(trafilatura.extract, html, **kw)
+        finally:
+            self.slots.release()
+
+@st.cache_resource(show_spinner=False)
+def get_extract_pool() -> ExtractPool:
+    return ExtractPool()
+
+async def _fetch_page(client, url: str, deadline: float, stats: Counter,
+                      **extract_kw) -> tuple[str | None, str | None]:
+    """(html, extracted text) for `url`, going through the crawl cache:
+    fresh entries skip the network, stale ones are revalidated with
+    If-None-Match / If-Modified-Since and a 304 reuses the cached text."""
+    cached = load_crawl_cache(url)
+    if cached and time.time() - cached["fetched"] < CRAWL_CACHE_TTL_S:
+        stats["fresh"] += 1
+        return cached["html"], cached["text"]
+    cond = {}
+    if cached and cached["etag"]:
+        cond["If-None-Match"] = cached["etag"]
+    if cached and cached["last_modified"]:
+        cond["If-Modified-Since"] = cached["last_modified"]
+    status, hdrs, html = await _fetch_capped(client, url, deadline, cond or None, stats)
+    if status == 304 and cached:
+        stats["revalidated"] += 1
+        touch_crawl_cache(url)
+        return cached["html"], cached["text"]
+    if not html:
+        return None, None
+    stats["fetched"] += 1
+    text = await get_extract_pool().extract(html, **extract_kw)
+    save_crawl_cache(url, hdrs.get("etag"), hdrs.get("last-modified"), html, text)
+    return html, text
+
+# ── Crawl frontier (robots.txt + sitemaps) ───────────────────────────────────
+SITEMAP_MAX_BYTES = 4_000_000    # total sitemap bytes streamed per crawl
+SITEMAP_MAX_FILES = 6            # sitemap documents opened (index + children)
+SITEMAP_MAX_URLS  = 5_000        # candidate URLs kept from sitemaps
+CRAWL_BYTE_BUDGET = 6_000_000    # page bytes downloaded per crawl
+DISCOVERY_BUDGET_S = 6.0         # robots.txt + sitemaps, out of CRAWL_BUDGET_S
+
+# Path segments that usually carry product / positioning copy
+PATH_HINTS = {
+    "pricing": 6, "plans": 5, "features": 5, "product": 5, "products": 5,
+    "platform": 4, "solutions": 4, "about": 4, "about-us": 4, "why": 3,
+    "customers": 3, "integrations": 3, "use-cases": 3, "compare": 3,
+    "enterprise": 2, "company": 2, "how-it-works": 3, "overview": 2,
+}
+PATH_PENALTIES = {
+    "blog": -3, "news": -2, "tag": -4, "category": -4, "author": -4, "page": -2,
+    "careers": -3, "jobs": -3, "legal": -5, "privacy": -5, "terms": -5,
+    "cookie": -5, "login": -6, "signin": -6, "signup": -4, "cart": -6, "search": -6,
+}
+
+def score_url(url: str) -> float:
+    """Heuristic value of a page for site intelligence: path hints, minus
+    depth, query strings and file-like paths."""
+    p = urlparse(url)
+    segs = [s for s in p.path.lower().split("/") if s]
+    score = 0.0
+    for s in segs:
+        s = s.rsplit(".", 1)[0]
+        score += PATH_HINTS.get(s, 0) + PATH_PENALTIES.get(s, 0)
+    score -= 0.75 * max(0, len(segs) - 1)
+    if p.query:
+        score -= 3
+    if re.search(r"\.(pdf|jpe?g|png|gif|svg|zip|xml|json|css|js)$", p.path.lower()):
+        score -= 10
+    return score
+
+async def _robots(client, root: str, deadline: float):
+    """Parsed robots.txt for the site (or None) — its Sitemap: lines included."""
+    try:
+        left = deadline - time.monotonic()
+        resp = await asyncio.wait_for(client.get(urljoin(root, "/robots.txt")),
+                                      min(left, CRAWL_REQ_TIMEOUT))
+        if resp.status_code != 200:
+            return None
+        rp = urllib.robotparser.RobotFileParser()
+        rp.parse(resp.text[:200_000].splitlines())
+        return rp
+    except Exception:
+        return None
+
+async def _stream_sitemap(client, url: str, deadline: float, budget: Counter):
+    """Stream one sitemap through XMLPullParser so large files and indexes are
+    never held in memory. Returns (page urls, child sitemap urls)."""
+    pages, children = [], []
+    parser = ET.XMLPullParser(events=("end",))
+    gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS) if url.endswith(".gz") else None
+    async def _read():
+        async with client.stream("GET", url) as resp:
+            if resp.status_code != 200:
+                return
+            async for chunk in resp.aiter_bytes():
+                budget["sitemap_bytes"] += len(chunk)
+                parser.feed(gunzip.decompress(chunk) if gunzip else chunk)
+                for _, el in parser.read_events():
+                    tag = el.tag.rsplit("}", 1)[-1]
+                    if tag in ("url", "sitemap"):
+                        loc = next((c.text for c in el if c.tag.endswith("loc") and c.text), None)
+                        if loc:
+                            (pages if tag == "url" else children).append(loc.strip())
+                        el.clear()
+                if (budget["sitemap_bytes"] >= SITEMAP_MAX_BYTES
+                        or len(pages) >= SITEMAP_MAX_URLS):
+                    return
+    try:
+        left = deadline - time.monotonic()
+        if left > 0:
+            await asyncio.wait_for(_read(), min(left, CRAWL_REQ_TIMEOUT))
+    except Exception:
+        pass    # keep whatever streamed in before the error
+    return pages, children
+
+async def sitemap_urls(client, root: str, robots, deadline: float) -> list:
+    """Page URLs from the site's sitemaps, following index files breadth-first
+    within SITEMAP_MAX_FILES / SITEMAP_MAX_BYTES."""
+    todo = list((robots.site_maps() if robots else None) or [urljoin(root, "/sitemap.xml")])
+    seen, pages, budget = set(), [], Counter()
+    while todo and len(seen) < SITEMAP_MAX_FILES and budget["sitemap_bytes"] < SITEMAP_MAX_BYTES \
+            and time.monotonic() < deadline:
+        sm = todo.pop(0)
+        if sm in seen:
+            continue
+        seen.add(sm)
+        found, children = await _stream_sitemap(client, sm, deadline, budget)
+        pages += found
+        # Product/page sitemaps first; post, tag and archive sitemaps last
+        todo += sorted(children, key=lambda u: -score_url(u.replace("sitemap", "")))
+        if len(pages) >= SITEMAP_MAX_URLS:
+            break
+    return pages[:SITEMAP_MAX_URLS]
+
+def build_frontier(root: str, candidates, robots, k: int) -> list:
+    """Top `k` same-site, robots-allowed candidates by score_url()."""
+    base, seen, ranked = extract_domain(root), {root.rstrip("/")}, []
+    for i, u in enumerate(candidates):
+        u = u.split("#", 1)[0]
+        key = u.rstrip("/")
+        if key in seen or extract_domain(u) != base or not u.startswith("http"):
+            continue
+        seen.add(key)
+        if robots and not robots.can_fetch(CRAWL_UA, u):
+            continue
+        ranked.append((-score_url(u), i, u))
+    ranked.sort()
+    return [u for _, _, u in ranked[:k]]
+
+async def crawl_site_async(url: str, log, max_pages: int = CRAWL_PAGES) -> str:
+    """Homepage first, then the `max_pages` best-scoring pages from robots.txt,
+    sitemaps and homepage links, fetched by CRAWL_CONCURRENCY workers over
+    one pooled (HTTP/2 when available) client within CRAWL_BUDGET_S and
+    CRAWL_BYTE_BUDGET. Discovery gets its own DISCOVERY_BUDGET_S cap."""
+    deadline = time.monotonic() + CRAWL_BUDGET_S
+    stats    = Counter()
+    limits   = httpx.Limits(max_connections=CRAWL_CONCURRENCY,
+                            max_keepalive_connections=CRAWL_CONCURRENCY)
+    async with httpx.AsyncClient(http2=HAS_H2, follow_redirects=True, limits=limits,
+                                 timeout=CRAWL_REQ_TIMEOUT,
+                                 headers={"User-Agent": CRAWL_UA}) as client:
+        disc_deadline = min(deadline, time.monotonic() + DISCOVERY_BUDGET_S)
+        async def discover():
+            robots = await _robots(client, url, disc_deadline)
+            return robots, await sitemap_urls(client, url, robots, disc_deadline)
+        found = asyncio.create_task(discover())
+        try:
+            raw, text = await _fetch_page(client, url, deadline, stats, include_links=False,
+                                          include_comments=False, favor_recall=True)
+        except Exception as e:
+            log(f"⚠️  Homepage crawl error: {e or type(e).__name__}")
+            found.cancel()
+            return ""
+        if not raw:
+            found.cancel()
+            return ""
+        texts = [text]
+        robots, mapped = await found
+        links = build_frontier(url, mapped + _internal_links(raw, url, HOME_LINK_LIMIT), robots, max_pages)
+        log(f"  🧭 frontier: {len(mapped)} sitemap URLs"
+            f"{', robots.txt' if robots else ''} → top {len(links)}")
+
+        # Workers pull from the frontier and re-check the byte budget before
+        # each fetch, so nothing new starts once it has been spent
+        todo, got = list(links), {}
+        async def worker():
+            while todo and stats["bytes"] < CRAWL_BYTE_BUDGET and time.monotonic() < deadline:
+                link = todo.pop(0)
+                log(f"  ↳ {link}")
+                try:
+                    got[link] = (await _fetch_page(client, link, deadline, stats,
+                                                   favor_recall=True))[1]
+                except Exception:
+                    pass
+        await asyncio.gather(*(worker() for _ in range(min(CRAWL_CONCURRENCY, len(links)))))
+        texts += [got.get(l) for l in links]
+    if time.monotonic() > deadline:
+        log(f"⚠️  Crawl budget of {CRAWL_BUDGET_S:.0f}s exhausted — using partial text")
+    elif stats["bytes"] >= CRAWL_BYTE_BUDGET:
+        log(f"⚠️  Crawl byte budget of {_fmt_bytes(CRAWL_BYTE_BUDGET)} reached — using partial text")
+    if stats["fresh"] or stats["revalidated"]:
+        log(f"  🗄️ crawl cache: {stats['fresh']} fresh, {stats['revalidated']} not modified, "
+            f"{stats['fetched']} downloaded")
+    evict_crawl_cache()
+    return "\n\n".join(t for t in texts if t)
+
+def crawl_site(url: str, log, max_pages: int = CRAWL_PAGES) -> str:
+    """Fetch homepage + up to `max_pages` internal links."""
     if not HAS_CRAWL:
         log("⚠️  trafilatura not available — skipping crawl")
         return ""
-    texts, seen_links = [], set()
     log(f"🌐 Crawling {url} ...")
+    if HAS_HTTPX:
+        return asyncio.run(crawl_site_async(url, log, max_pages))
+
+    # Serial fallback without httpx
+    texts, links = [], []
     try:
         raw = trafilatura.fetch_url(url)
         if raw:
             t = trafilatura.extract(raw, include_links=False, include_comments=False,
                                     favor_recall=True)
             if t: texts.append(t)
-            # Collect internal links
-            soup = BeautifulSoup(raw, "html.parser")
-            base = extract_domain(url)
-            for a in soup.find_all("a", href=True):
-                full = urljoin(url, a["href"])
-                fd = extract_domain(full)
-                if fd == base and full not in seen_links and full != url and "?" not in full:
-                    seen_links.add(full)
-                if len(seen_links) >= 6:
-                    break
+            links = _internal_links(raw, url, max(6, max_pages * 2))
     except Exception as e:
         log(f"⚠️  Homepage crawl error: {e}")
 
-    for link in list(seen_links)[:3]:
+    for link in links[:max_pages]:
         try:
             log(f"  ↳ {link}")
             raw2 = trafilatura.fetch_url(link)
@@ -361,67 +1292,521 @@ def crawl_site(url: str, log) -> str:
     return "\n\n".join(texts)
 
 
-def bedrock_generate_prompts(brand, domain, tagline, products, topics, competitors, n) -> list[str] | None:
+BEDROCK_MODEL_ID        = "us.anthropic.claude-3-5-haiku-20241022-v1:0"
+BEDROCK_CACHE_TTL_S     = 7 * 24 * 3600
+BEDROCK_CACHE_MAX_BYTES = 16 * 2**20
+
+BEDROCK_REGION          = os.environ.get("AICLAW_BEDROCK_REGION", "us-east-1")
+BEDROCK_ENDPOINT        = os.environ.get("AICLAW_BEDROCK_ENDPOINT") or None  # e.g. a local stub
+BEDROCK_CONNECT_TIMEOUT = 5
+BEDROCK_READ_TIMEOUT    = 45
+BEDROCK_MAX_ATTEMPTS    = 4
+BEDROCK_CONCURRENCY     = int(os.environ.get("AICLAW_BEDROCK_CONCURRENCY", "4"))
+
+class BedrockClient:
+    """One lazily built bedrock-runtime client shared by every thread, with
+    explicit timeouts, adaptive retries, a concurrency cap and per-call
+    latency / error counters. boto3 clients are thread-safe once created;
+    only creation is serialised here."""
+
+    def __init__(self, region: str = BEDROCK_REGION, endpoint_url: str | None = BEDROCK_ENDPOINT,
+                 concurrency: int = BEDROCK_CONCURRENCY):
+        self.region, self.endpoint_url = region, endpoint_url
+        self.slots   = threading.BoundedSemaphore(max(1, concurrency))
+        self._lock   = threading.Lock()
+        self._client = None
+        self._local  = threading.local()
+        self.calls = self.errors = 0
+        self.total_ms = self.max_ms = 0.0
+        self.error_types = Counter()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    cfg = BotoConfig(
+                        connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+                        read_timeout=BEDROCK_READ_TIMEOUT,
+                        retries={"mode": "adaptive", "max_attempts": BEDROCK_MAX_ATTEMPTS},
+                        max_pool_connections=max(10, BEDROCK_CONCURRENCY),
+                    )
+                    self._client = boto3.client("bedrock-runtime", region_name=self.region,
+                                                endpoint_url=self.endpoint_url, config=cfg)
+        return self._client
+
+    @property
+    def last_error(self) -> str | None:
+        """Most recent failure on the calling thread."""
+        return getattr(self._local, "error", None)
+
+    def clear_error(self):
+        self._local.error = None
+
+    def invoke(self, model_id: str, body: str) -> dict:
+        """invoke_model → parsed JSON response body. Exceptions propagate."""
+        self.clear_error()
+        with self.slots:
+            t0 = time.perf_counter()
+            try:
+                resp = self.client.invoke_model(
+                    modelId=model_id, body=body,
+                    contentType="application/json", accept="application/json"
+                )
+                return json.loads(resp["body"].read())
+            except Exception as e:
+                self._local.error = f"{type(e).__name__}: {str(e)[:120]}"
+                with self._lock:
+                    self.errors += 1
+                    self.error_types[type(e).__name__] += 1
+                raise
+            finally:
+                ms = (time.perf_counter() - t0) * 1000
+                with self._lock:
+                    self.calls += 1
+                    self.total_ms += ms
+                    self.max_ms = max(self.max_ms, ms)
+
+    def invoke_stream(self, model_id: str, body: str):
+        """invoke_model_with_response_stream → yields text deltas as they arrive."""
+        self.clear_error()
+        with self.slots:
+            t0 = time.perf_counter()
+            try:
+                resp = self.client.invoke_model_with_response_stream(
+                    modelId=model_id, body=body,
+                    contentType="application/json", accept="application/json"
+                )
+                for event in resp["body"]:
+                    chunk = event.get("chunk")
+                    if not chunk:
+                        continue
+                    data = json.loads(chunk["bytes"])
+                    if data.get("type") == "content_block_delta":
+                        yield data["delta"].get("text", "")
+            except Exception as e:
+                self._local.error = f"{type(e).__name__}: {str(e)[:120]}"
+                with self._lock:
+                    self.errors += 1
+                    self.error_types[type(e).__name__] += 1
+                raise
+            finally:
+                ms = (time.perf_counter() - t0) * 1000
+                with self._lock:
+                    self.calls += 1
+                    self.total_ms += ms
+                    self.max_ms = max(self.max_ms, ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors,
+                    "avg_ms": self.total_ms / self.calls if self.calls else 0.0,
+                    "max_ms": self.max_ms, "error_types": dict(self.error_types)}
+
+@st.cache_resource(show_spinner=False)
+def get_bedrock() -> BedrockClient:
+    return BedrockClient()
+
+def bedrock_body(user_msg: str, max_tokens: int) -> str:
+    return json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": user_msg}]
+    })
+
+def bedrock_cache_key(body: str) -> str:
+    return hashlib.sha256(f"{BEDROCK_MODEL_ID}\n{body}".encode()).hexdigest()
+
+def bedrock_json(user_msg: str, max_tokens: int, parse, refresh: bool = False):
+    """Invoke the Bedrock model and return `parse(text)`. Responses are cached
+    by sha256(model id + request body); only ones that parse are stored, and
+    `refresh=True` skips the lookup and overwrites the entry."""
+    body = bedrock_body(user_msg, max_tokens)
+    key  = bedrock_cache_key(body)
+    get_bedrock().clear_error()
+    if not refresh:
+        text = load_bedrock_cache(key, BEDROCK_CACHE_TTL_S)
+        if text is not None:
+            value = parse(text)
+            if value is not None:
+                return value
+    result = get_bedrock().invoke(BEDROCK_MODEL_ID, body)
+    text = result["content"][0]["text"].strip()
+    value = parse(text)
+    if value is not None:
+        save_bedrock_cache(key, BEDROCK_MODEL_ID, text)
+        evict_bedrock_cache(BEDROCK_CACHE_MAX_BYTES)
+    return value
+
+def _prompt_request(brand, domain, tagline, products, topics, competitors, n) -> str:
+    comp_str = ", ".join(competitors[:4]) if competitors else "industry alternatives"
+    prod_str = ", ".join(products[:3]) if products else "software/tool"
+    topic_str = ", ".join(topics[:4]) if topics else "technology"
+    user_msg = (
+        f"You are an AI visibility researcher. Generate exactly {n} conversational search prompts "
+        f"that real buyers type into ChatGPT, Gemini, or Perplexity when researching solutions like '{brand}'.\n\n"
+        f"Brand context:\n"
+        f"- Brand: {brand} ({domain})\n"
+        f"- What it does: {tagline[:300] if tagline else 'N/A'}\n"
+        f"- Products/services: {prod_str}\n"
+        f"- Category/topics: {topic_str}\n"
+        f"- Known competitors: {comp_str}\n\n"
+        f"RULES — read carefully:\n"
+        f"1. 80% of prompts must be CATEGORY-LEVEL (no brand name) — real buyer questions\n"
+        f"2. Only 20% (max 2-3) can mention '{brand}' directly — for validation\n"
+        f"3. Mix these types: best-in-category, comparison, how-to, review, buyer-decision, alternative, persona-specific, list/roundup, long-tail\n"
+        f"4. Each prompt: 50-150 chars, conversational, specific\n"
+        f"5. Include year 2025 or 2026 in some\n"
+        f"6. Use real buyer language — not marketing speak\n\n"
+        f"Examples of GOOD category prompts:\n"
+        f"- 'best conversion optimization tool for ecommerce 2026'\n"
+        f"- 'how do I fix in-app browser killing my Shopify sales'\n"
+        f"- 'should I use deep linking for influencer campaigns'\n"
+        f"- 'alternatives to branch.io for small business'\n"
+        f"- 'top link tracking tools for creators under $100/month'\n\n"
+        f"Return ONLY a JSON array of {n} strings, nothing else.\n"
+    )
+    return user_msg
+
+def _parse_prompt_list(text: str, n: int) -> list[str] | None:
+    m = re.search(r'\[.*\]', text, re.DOTALL)
+    if m:
+        prompts = json.loads(m.group())
+        if isinstance(prompts, list) and len(prompts) >= 3:
+            return [str(p) for p in prompts[:n]]
+    return None
+
+def bedrock_generate_prompts(brand, domain, tagline, products, topics, competitors, n,
+                             refresh: bool = False) -> list[str] | None:
     """Call Bedrock Claude Haiku to generate smart category-level buyer prompts. NO brand name in prompts (except 1-2 branded checks)."""
     if not HAS_BEDROCK:
         return None
     try:
-        client = boto3.client("bedrock-runtime", region_name="us-east-1")
-        comp_str = ", ".join(competitors[:4]) if competitors else "industry alternatives"
-        prod_str = ", ".join(products[:3]) if products else "software/tool"
-        topic_str = ", ".join(topics[:4]) if topics else "technology"
-        user_msg = (
-            f"You are an AI visibility researcher. Generate exactly {n} conversational search prompts "
-            f"that real buyers type into ChatGPT, Gemini, or Perplexity when researching solutions like '{brand}'.\n\n"
-            f"Brand context:\n"
-            f"- Brand: {brand} ({domain})\n"
-            f"- What it does: {tagline[:300] if tagline else 'N/A'}\n"
-            f"- Products/services: {prod_str}\n"
-            f"- Category/topics: {topic_str}\n"
-            f"- Known competitors: {comp_str}\n\n"
-            f"RULES — read carefully:\n"
-            f"1. 80% of prompts must be CATEGORY-LEVEL (no brand name) — real buyer questions\n"
-            f"2. Only 20% (max 2-3) can mention '{brand}' directly — for validation\n"
-            f"3. Mix these types: best-in-category, comparison, how-to, review, buyer-decision, alternative, persona-specific, list/roundup, long-tail\n"
-            f"4. Each prompt: 50-150 chars, conversational, specific\n"
-            f"5. Include year 2025 or 2026 in some\n"
-            f"6. Use real buyer language — not marketing speak\n\n"
-            f"Examples of GOOD category prompts:\n"
-            f"- 'best conversion optimization tool for ecommerce 2026'\n"
-            f"- 'how do I fix in-app browser killing my Shopify sales'\n"
-            f"- 'should I use deep linking for influencer campaigns'\n"
-            f"- 'alternatives to branch.io for small business'\n"
-            f"- 'top link tracking tools for creators under $100/month'\n\n"
-            f"Return ONLY a JSON array of {n} strings, nothing else.\n"
-        )
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 800,
-            "messages": [{"role": "user", "content": user_msg}]
-        })
-        resp = client.invoke_model(
-            modelId="us.anthropic.claude-3-5-haiku-20241022-v1:0",
-            body=body, contentType="application/json", accept="application/json"
-        )
-        result = json.loads(resp["body"].read())
-        text = result["content"][0]["text"].strip()
-        m = re.search(r'\[.*\]', text, re.DOTALL)
-        if m:
-            prompts = json.loads(m.group())
-            if isinstance(prompts, list) and len(prompts) >= 3:
-                return [str(p) for p in prompts[:n]]
+        user_msg = _prompt_request(brand, domain, tagline, products, topics, competitors, n)
+        return bedrock_json(user_msg, 800, lambda t: _parse_prompt_list(t, n), refresh)
     except Exception:
         pass
     return None
 
 
-def bedrock_analyze_site(site_text: str, brand: str, domain: str) -> dict:
+# ── Streaming prompt generation ───────────────────────────────────────────────
+STREAM_PROMPTS = os.environ.get("AICLAW_STREAM_PROMPTS", "1") != "0"
+FEED_POLL_S    = 0.1
+
+class JsonArrayStream:
+    """Pulls complete string items out of a JSON array while its text is
+    still streaming in. Anything before the opening '[' is ignored."""
+
+    def __init__(self):
+        self.buf, self.pos = "", 0
+        self.started = self.done = False
+
+    def feed(self, text: str) -> list[str]:
+        self.buf += text
+        out = []
+        while not self.done:
+            if not self.started:
+                i = self.buf.find("[", self.pos)
+                if i < 0:
+                    self.pos = len(self.buf)
+                    break
+                self.started, self.pos = True, i + 1
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n,":
+                self.pos += 1
+            if self.pos >= len(self.buf):
+                break
+            if self.buf[self.pos] == "]":
+                self.done = True
+                break
+            if self.buf[self.pos] != '"':
+                k = min((x for x in (self.buf.find(",", self.pos), self.buf.find("]", self.pos))
+                         if x >= 0), default=-1)
+                if k < 0:
+                    break       # non-string item still arriving
+                self.pos = k
+                continue
+            j, esc = self.pos + 1, False
+            while j < len(self.buf):
+                c = self.buf[j]
+                if esc:
+                    esc = False
+                elif c == "\\":
+                    esc = True
+                elif c == '"':
+                    break
+                j += 1
+            if j >= len(self.buf):
+                break           # string still open
+            out.append(json.loads(self.buf[self.pos:j + 1]))
+            self.pos = j + 1
+        return out
+
+
+class PromptFeed:
+    """Prompt list that fills in over time. A producer put()s prompts and
+    close()s the feed; each Step B provider iterates it independently and
+    blocks only when it has caught up with the producer."""
+
+    def __init__(self, expected: int, prompts=()):
+        self.expected   = expected
+        self._items  = list(prompts)
+        self._closed = False
+        self._cond   = threading.Condition()
+
+    def put(self, prompt: str) -> bool:
+        with self._cond:
+            if self._closed or prompt in self._items:
+                return False
+            self._items.append(prompt)
+            self._cond.notify_all()
+            return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def snapshot(self) -> list:
+        with self._cond:
+            return list(self._items)
+
+    def wait(self, timeout: float | None = None) -> list:
+        """Block until the producer closes the feed; returns every prompt."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed, timeout)
+            return list(self._items)
+
+    async def stream(self):
+        i = 0
+        while True:
+            closed = self._closed
+            if i < len(self._items):
+                yield self._items[i]
+                i += 1
+            elif closed:
+                return
+            else:
+                await asyncio.sleep(FEED_POLL_S)
+
+async def _aiter_prompts(prompts):
+    if isinstance(prompts, PromptFeed):
+        async for p in prompts.stream():
+            yield p
+    else:
+        for p in prompts:
+            yield p
+
+def bedrock_stream_prompts(brand, domain, tagline, products, topics, competitors, n,
+                           refresh: bool = False):
+    """Like bedrock_generate_prompts(), but yields each prompt as soon as its
+    JSON string is complete (invoke_model_with_response_stream). Shares the
+    response cache with the non-streaming call."""
+    user_msg = _prompt_request(brand, domain, tagline, products, topics, competitors, n)
+    body     = bedrock_body(user_msg, 800)
+    key      = bedrock_cache_key(body)
+    get_bedrock().clear_error()
+    if not refresh:
+        text = load_bedrock_cache(key, BEDROCK_CACHE_TTL_S)
+        cached = _parse_prompt_list(text, n) if text is not None else None
+        if cached:
+            yield from cached
+            return
+    parser, text, count = JsonArrayStream(), [], 0
+    for delta in get_bedrock().invoke_stream(BEDROCK_MODEL_ID, body):
+        text.append(delta)
+        for p in parser.feed(delta):
+            if count < n:
+                count += 1
+                yield str(p)
+    full = "".join(text).strip()
+    if _parse_prompt_list(full, n) is not None:
+        save_bedrock_cache(key, BEDROCK_MODEL_ID, full)
+        evict_bedrock_cache(BEDROCK_CACHE_MAX_BYTES)
+
+def generate_prompts_into(feed: PromptFeed, intel: dict, n: int, log,
+                          refresh: bool = False, speculative: list = ()) -> list:
+    """Producer side of a PromptFeed: stream Bedrock prompts into `feed`,
+    skipping near-duplicates of prompts already queued, top up with the most
+    diverse template prompts if the stream fails or runs short, then close
+    it. `speculative` prompts already in the feed are committed: they count
+    toward `n` and take the place of the first branded prompts Bedrock
+    produces, so nothing that was queried is thrown away. Blocking — run it
+    off the event loop."""
+    brand, domain = intel["brand"], intel["domain"]
+    topics   = ([intel["category"]] if intel.get("category") else []) + intel.get("topics", [])
+    state    = {"count": len(speculative), "spare": len(speculative),
+                "merged": 0, "ai": 0, "dups": 0}
+    sigs     = [_prompt_shingles(p) for p in feed.snapshot()]
+
+    def take(p: str, from_ai: bool = False):
+        if state["count"] >= n:
+            return
+        sh = _prompt_shingles(p)
+        if from_ai and state["spare"] and brand.lower() in p.lower():
+            state["spare"] -= 1         # a speculative prompt already covers this slot
+            state["merged"] += 1
+            state["ai"] += from_ai
+            return
+        if any(_jaccard(sh, s) >= PROMPT_DUP_JACCARD for s in sigs):
+            state["dups"] += 1          # near-duplicate of a prompt already queued
+            return
+        if feed.put(p):
+            sigs.append(sh)
+            if from_ai and not state["ai"] and not speculative:
+                log(f"  ⚡ First prompt ready — queries starting: {p[:60]}")
+        else:
+            return
+        state["count"] += 1
+        state["ai"] += from_ai
+
+    try:
+        if HAS_BEDROCK:
+            log("🤖 Streaming AI-powered buyer prompts into the query queue...")
+            try:
+                for p in bedrock_stream_prompts(brand, domain, intel.get("tagline", ""),
+                                                intel.get("products", []), topics,
+                                                intel.get("competitors", []), n, refresh):
+                    take(p, from_ai=True)
+            except Exception:
+                pass
+        if state["ai"] >= min(3, n):
+            log(f"✅ AI generated {state['ai']} targeted prompts")
+        elif HAS_BEDROCK:
+            why = get_bedrock().last_error
+            log(f"⚠️  Bedrock prompt streaming failed{f' ({why})' if why else ''} "
+                f"— using template prompts")
+        queued = feed.snapshot()
+        fill, _ = dedupe_prompts(queued, len(queued) + n - state["count"],
+                                 generate_prompts_template(brand, domain, intel.get("topics", []),
+                                                           intel.get("competitors", []),
+                                                           PROMPT_POOL))
+        for p in fill[len(queued):]:
+            take(p)
+        if state["dups"]:
+            log(f"✂️  Dropped {state['dups']} near-duplicate prompts")
+        if state["count"] < n:
+            log(f"⚠️  Only {state['count']} of {n} prompts are distinct enough to query")
+        if speculative:
+            log(f"  ⚡ Speculative prompts kept: {len(speculative)}"
+                + (f" ({state['merged']} matched AI branded prompts)" if state["merged"] else ""))
+    finally:
+        feed.close()
+    return feed.snapshot()
+
+
+# ── Speculative start ─────────────────────────────────────────────────────────
+SPECULATE = os.environ.get("AICLAW_SPECULATE", "1") != "0"
+SPECULATIVE_TEMPLATES = ["{brand} review 2025", "alternatives to {brand}", "{brand} pros and cons"]
+SPECULATIVE_PROMPTS   = 2     # Bedrock is asked for 2–3 branded prompts; don't exceed that
+
+def speculative_prompts(brand: str, k: int = SPECULATIVE_PROMPTS) -> list:
+    """Branded prompts that need nothing but the brand name."""
+    return [t.format(brand=brand) for t in SPECULATIVE_TEMPLATES[:k]]
+
+
+# ── Site text packing ─────────────────────────────────────────────────────────
+SITE_TEXT_BUDGET = 4000          # chars of crawled text sent to Bedrock
+MINHASH_PERMS, MINHASH_BANDS = 32, 8
+NEAR_DUP_JACCARD = 0.8
+_MINHASH_SEEDS = [random.Random(i).getrandbits(64) for i in range(MINHASH_PERMS)]
+_BOILERPLATE_RE = re.compile(
+    r"cookie|privacy policy|terms of (service|use)|all rights reserved|©|copyright|"
+    r"subscribe|newsletter|sign ?in|log ?in|sign ?up|skip to (main )?content|"
+    r"follow us|javascript", re.I)
+_STOPWORDS = set("""the and for with that this from your you our are was were will have has
+    into more than about their they them what when which while also can all any each
+    how its it's not but out get just most other some such only own same very""".split())
+
+def _words(text: str) -> list:
+    return re.findall(r"[a-z0-9$€£%]+", text.lower())
+
+def _shingles(text: str, k: int = 3) -> set:
+    """Word k-gram shingles (the whole text as one shingle when shorter)."""
+    w = _words(text)
+    return {" ".join(w[i:i + k]) for i in range(max(1, len(w) - k + 1))}
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def _stable_hash(s: str) -> int:
+    """64-bit hash that is the same in every process (unlike hash(), which
+    PYTHONHASHSEED randomises) — packed text must match across workers."""
+    return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+
+def _minhash(shingles: set) -> tuple:
+    hs = [_stable_hash(s) for s in shingles]
+    return tuple(min((h ^ seed) & 0xFFFFFFFFFFFFFFFF for h in hs) for seed in _MINHASH_SEEDS)
+
+def _info_score(par: str) -> float:
+    """Distinct content words per paragraph, with a bump for prices and
+    numbers and a penalty for legal / nav boilerplate."""
+    w = [x for x in _words(par) if len(x) > 3 and x not in _STOPWORDS]
+    score = len(set(w)) + 3 * bool(re.search(r"[$€£]\s?\d|\d+\s?%|/mo", par))
+    if _BOILERPLATE_RE.search(par):
+        score -= 10
+    return score / (1 + len(par) / 600)     # favour dense paragraphs over walls of text
+
+def pack_site_text(site_text: str, budget: int = SITE_TEXT_BUDGET) -> str:
+    """Drop cross-page boilerplate and near-duplicate paragraphs (MinHash LSH
+    over word shingles, confirmed by Jaccard), then fill `budget` with the
+    most informative survivors in their original order."""
+    pages = [p for p in site_text.split("\n\n") if p.strip()]
+    paras, seen_on = [], {}
+    for pi, page in enumerate(pages):
+        for line in page.split("\n"):
+            line = line.strip()
+            if len(line) < 25 and not re.search(r"[$€£]\s?\d", line):
+                continue    # nav labels, buttons, headings without content
+            key = " ".join(_words(line))
+            seen_on.setdefault(key, set()).add(pi)
+            paras.append((pi, line, key))
+
+    # Short or legal-looking text repeated across pages is header/footer chrome;
+    # longer repeats fall through to the near-duplicate check and keep one copy
+    chrome = {k for k, ps in seen_on.items()
+              if len(pages) > 1 and len(ps) >= max(2, len(pages) // 2)
+              and (len(k) < 80 or _BOILERPLATE_RE.search(k))}
+    rows   = max(1, MINHASH_PERMS // MINHASH_BANDS)
+    bands, kept = {}, []
+    for idx, (pi, line, key) in enumerate(paras):
+        if key in chrome:
+            continue
+        sh  = _shingles(line)
+        sig = _minhash(sh)
+        dup = False
+        for b in range(MINHASH_BANDS):
+            for j in bands.get((b, sig[b * rows:(b + 1) * rows]), ()):
+                if _jaccard(sh, kept[j][3]) >= NEAR_DUP_JACCARD:
+                    dup = True; break
+            if dup: break
+        if dup:
+            continue
+        for b in range(MINHASH_BANDS):
+            bands.setdefault((b, sig[b * rows:(b + 1) * rows]), []).append(len(kept))
+        kept.append((idx, line, _info_score(line), sh))
+
+    chosen, used = [], 0
+    for idx, line, _, _ in sorted(kept, key=lambda k: -k[2]):
+        if used + len(line) + 1 <= budget:
+            chosen.append((idx, line)); used += len(line) + 1
+    if not chosen and kept:
+        chosen = [(kept[0][0], kept[0][1][:budget])]
+    return "\n".join(line for _, line in sorted(chosen))
+
+
+def bedrock_analyze_site(site_text: str, brand: str, domain: str, refresh: bool = False) -> dict:
     """Use Bedrock Claude Haiku to extract real site intelligence from crawled text."""
     if not HAS_BEDROCK or not site_text:
         return {}
     try:
-        client = boto3.client("bedrock-runtime", region_name="us-east-1")
-        snippet = site_text[:4000]
+        snippet = pack_site_text(site_text)
         user_msg = (
             f"Analyze this website content for '{brand}' ({domain}) and extract:\n\n"
             f"Website text:\n{snippet}\n\n"
@@ -435,20 +1820,10 @@ def bedrock_analyze_site(site_text: str, brand: str, domain: str) -> dict:
             f"- price_range: estimated price range if visible (e.g. '$19-$99/mo') or null\n\n"
             f"Return ONLY valid JSON, nothing else."
         )
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 500,
-            "messages": [{"role": "user", "content": user_msg}]
-        })
-        resp = client.invoke_model(
-            modelId="us.anthropic.claude-3-5-haiku-20241022-v1:0",
-            body=body, contentType="application/json", accept="application/json"
-        )
-        result = json.loads(resp["body"].read())
-        text = result["content"][0]["text"].strip()
-        m = re.search(r'\{.*\}', text, re.DOTALL)
-        if m:
-            return json.loads(m.group())
+        def parse(text):
+            m = re.search(r'\{.*\}', text, re.DOTALL)
+            return json.loads(m.group()) if m else None
+        return bedrock_json(user_msg, 500, parse, refresh) or {}
     except Exception:
         pass
     return {}
@@ -481,22 +1856,90 @@ def generate_prompts_template(brand, domain, topics, competitors, n) -> list[str
         f"top rated {cat} tools experts recommend 2025",
         f"{brand} customer reviews and ratings",
         f"enterprise {cat} solutions compared 2025",
+        # Past 20: the pool dedupe_prompts() tops up from
+        f"how do {uc} pick a {cat} tool",
+        f"cheapest {cat} option with a free plan",
+        f"{cat} tools with the best customer support",
+        f"open source {cat} alternatives",
+        f"easiest {cat} to set up for beginners",
+        f"{cat} with strong reporting and analytics",
+        f"migrating from {c} to a new {cat} provider",
+        f"{brand} onboarding and learning curve",
+        f"{brand} security and compliance",
+        f"does {brand} offer a free trial",
+        f"common complaints about {brand}",
+        f"what do {uc} use for {cat}",
     ]
     return templates[:n]
 
 
-def analyze_site(url: str, brand_override: str, num_prompts: int, log) -> dict:
-    """Full Step A pipeline: crawl → Bedrock site analysis → Bedrock prompt generation."""
+# ── Prompt dedupe ─────────────────────────────────────────────────────────────
+PROMPT_DUP_JACCARD = float(os.environ.get("AICLAW_PROMPT_DUP_JACCARD", "0.7"))
+PROMPT_POOL        = 32      # template prompts available for topping up
+_PROMPT_FILLER = set("""best top rated leading good great popular recommended in of to on is
+    a an i my me should which what how do does or vs versus better 2024 2025 2026 new""".split())
+_PROMPT_SYNONYMS = {
+    "software": "tool", "tools": "tool", "platform": "tool", "platforms": "tool",
+    "solution": "tool", "solutions": "tool", "app": "tool", "apps": "tool",
+    "recommendations": "recommend", "recommendation": "recommend", "recommended": "recommend",
+    "reviews": "review", "ratings": "review", "rating": "review",
+    "alternative": "alternatives", "competitors": "alternatives",
+    "compare": "compared", "comparison": "compared",
+    "business": "businesses",
+    "startup": "startups", "price": "pricing", "cost": "pricing",
+}
+
+def _prompt_shingles(prompt: str) -> set:
+    """Canonical content words of a prompt: filler, stopwords and years
+    dropped, common synonyms folded ("top rated X tools" ≈ "best X software")."""
+    words = [_PROMPT_SYNONYMS.get(w, w) for w in _words(prompt)
+             if w not in _PROMPT_FILLER and w not in _STOPWORDS]
+    return _shingles(" ".join(words), k=1)
+
+def dedupe_prompts(prompts: list, n: int, extra: list = (),
+                   threshold: float = PROMPT_DUP_JACCARD) -> tuple[list, list]:
+    """Collapse near-synonymous prompts (Jaccard over _prompt_shingles() ≥
+    `threshold`; the first one wins), then top up to `n` from `extra`,
+    always taking the candidate least similar to what is already kept.
+    Returns (kept, dropped)."""
+    kept, sigs, dropped = [], [], []
+    def closest(sh: set) -> float:
+        return max((_jaccard(sh, s) for s in sigs), default=0.0)
+
+    for p in prompts:
+        sh = _prompt_shingles(p)
+        if closest(sh) >= threshold:
+            dropped.append(p)
+        elif len(kept) < n:
+            kept.append(p); sigs.append(sh)
+
+    pool = [(p, _prompt_shingles(p)) for p in dict.fromkeys(extra) if p not in kept]
+    while len(kept) < n and pool:
+        pool = [(p, sh) for p, sh in pool if closest(sh) < threshold]
+        if not pool:
+            break
+        p, sh = min(pool, key=lambda c: closest(c[1]))
+        pool.remove((p, sh))
+        kept.append(p); sigs.append(sh)
+    return kept, dropped
+
+
+def analyze_site(url: str, brand_override: str, num_prompts: int, log,
+                 crawl_pages: int = CRAWL_PAGES, refresh_ai: bool = False,
+                 stream_prompts: bool = False) -> dict:
+    """Full Step A pipeline: crawl → Bedrock site analysis → Bedrock prompt generation.
+    With `stream_prompts` the prompt step is left to generate_prompts_into()
+    and the returned intel has an empty prompt list."""
     domain    = extract_domain(url)
     brand     = brand_override.strip() or brand_from_domain(domain)
-    site_text = crawl_site(url, log)
+    site_text = crawl_site(url, log, crawl_pages)
 
     tagline, products, topics, competitors, category, target_audience = "", [], [], [], "", ""
 
     # Step A1: Use Bedrock to extract real site intelligence
     if site_text and HAS_BEDROCK:
         log("🤖 Analyzing site with Bedrock Claude Haiku...")
-        intel = bedrock_analyze_site(site_text, brand, domain)
+        intel = bedrock_analyze_site(site_text, brand, domain, refresh_ai)
         if intel:
             tagline        = intel.get("tagline", "")
             category       = intel.get("category", "")
@@ -505,6 +1948,8 @@ def analyze_site(url: str, brand_override: str, num_prompts: int, log) -> dict:
             competitors    = intel.get("competitors", [])
             target_audience= intel.get("target_audience", "")
             log(f"✅ Site intel extracted by AI")
+        elif get_bedrock().last_error:
+            log(f"⚠️  Bedrock site analysis failed ({get_bedrock().last_error})")
     elif site_text:
         # Fallback regex extraction
         lines = [l.strip() for l in site_text.split("\n") if l.strip()]
@@ -523,22 +1968,37 @@ def analyze_site(url: str, brand_override: str, num_prompts: int, log) -> dict:
 
     # Step A2: Use Bedrock to generate smart buyer prompts
     prompts = None
-    if HAS_BEDROCK:
+    if stream_prompts:
+        prompts = []
+    elif HAS_BEDROCK:
         log("🤖 Generating AI-powered buyer prompts...")
         # Augment topics with category
         all_topics = ([category] if category else []) + topics
         prompts = bedrock_generate_prompts(
-            brand, domain, tagline, products, all_topics, competitors, num_prompts
+            brand, domain, tagline, products, all_topics, competitors, num_prompts,
+            refresh=refresh_ai
         )
         if prompts:
             log(f"✅ AI generated {len(prompts)} targeted prompts")
         else:
-            log("⚠️  Bedrock prompt generation failed — using template prompts")
+            why = get_bedrock().last_error
+            log(f"⚠️  Bedrock prompt generation failed{f' ({why})' if why else ''} "
+                f"— using template prompts")
 
-    if not prompts:
+    if not prompts and not stream_prompts:
         prompts = generate_prompts_template(brand, domain, topics, competitors, num_prompts)
         log(f"✅ Generated {len(prompts)} template prompts")
 
+    if prompts:
+        prompts, dropped = dedupe_prompts(
+            prompts, num_prompts,
+            generate_prompts_template(brand, domain, topics, competitors, PROMPT_POOL))
+        if dropped:
+            log(f"✂️  Dropped {len(dropped)} near-duplicate prompts — {len(prompts)} distinct "
+                f"prompts to query")
+        if len(prompts) < num_prompts:
+            log(f"⚠️  Only {len(prompts)} of {num_prompts} prompts are distinct enough to query")
+
     return {
         "brand": brand, "domain": domain, "tagline": tagline,
         "category": category, "products": products, "topics": topics,
@@ -552,56 +2012,181 @@ def analyze_site(url: str, brand_override: str, num_prompts: int, log) -> dict:
 # ║  Pure real-user simulation. Zero API keys.                   ║
 # ╚══════════════════════════════════════════════════════════════╝
 
-# ── helpers ──────────────────────────────────────────────────────────────────
+# ── helpers ──────────────────────────────────────────────────────────────────
+async def _race_selectors(page, selectors: list, timeout=8000, state="visible"):
+    """
+    Wait for every candidate selector at once and return (element, selector)
+    for the first match, or (None, None) when all time out. A page costs one
+    timeout window instead of the sum over stale selectors. Ties go to the
+    earlier selector in the list.
+    """
+    if not selectors:
+        return None, None
+    tasks = {
+        asyncio.ensure_future(page.wait_for_selector(sel, timeout=timeout, state=state)): sel
+        for sel in selectors
+    }
+    rank = {sel: i for i, sel in enumerate(selectors)}
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in sorted(done, key=lambda t: rank[tasks[t]]):
+                if t.exception() is None and t.result() is not None:
+                    return t.result(), tasks[t]
+        return None, None
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _race_click_type(page, selectors: list, text: str, delay=35, timeout=6000):
+    """Race `selectors`, click the winner and type `text`. Returns
+    (winning selector or None, ms until it was found). If the winner can't be
+    clicked the rest are raced again."""
+    t0 = time.monotonic()
+    remaining = list(selectors)
+    while remaining:
+        el, sel = await _race_selectors(page, remaining, timeout=timeout)
+        if el is None:
+            break
+        found_ms = (time.monotonic() - t0) * 1000
+        try:
+            await el.click()
+            await page.keyboard.type(text, delay=delay)
+            return sel, found_ms
+        except Exception:
+            remaining.remove(sel)
+    return None, (time.monotonic() - t0) * 1000
+
 async def _safe_fill(page, selectors: list, text: str, timeout=8000) -> bool:
-    """Try a list of CSS/xpath selectors; fill the first one that exists."""
-    for sel in selectors:
+    """Race a list of CSS/xpath selectors; fill the first one that appears."""
+    remaining = list(selectors)
+    while remaining:
+        el, sel = await _race_selectors(page, remaining, timeout=timeout)
+        if el is None:
+            return False
         try:
-            el = await page.wait_for_selector(sel, timeout=timeout, state="visible")
-            if el:
-                await el.click()
-                await el.fill(text)
-                return True
+            await el.click()
+            await el.fill(text)
+            return True
         except Exception:
-            continue
+            remaining.remove(sel)
     return False
 
 async def _safe_text(page, selectors: list, timeout=10000) -> str:
-    """Return inner_text of the first matching selector."""
-    for sel in selectors:
+    """Return inner_text of the first selector to match."""
+    el, _ = await _race_selectors(page, selectors, timeout=timeout, state="attached")
+    if el is None:
+        return ""
+    try:
+        return (await el.inner_text()).strip()
+    except Exception:
+        return ""
+
+# ── In-page completion detector ──────────────────────────────────────────────
+# A MutationObserver armed *before* the prompt is submitted. It resolves a single
+# promise (window.__aiclawDone) when the answer node has grown by `minChars` and
+# then been quiet for `quietMs`, when a "stop generating" control that was seen
+# disappears, or after `timeoutMs`. Python awaits that one promise instead of
+# shipping document.body.innerText across CDP every couple of seconds.
+_ARM_COMPLETION_JS = """
+({answerSels, stopSels, quietMs, timeoutMs, minChars}) => {
+    const t0 = performance.now();
+    let matched = null;
+    const find = () => {
+        for (const s of answerSels) {
+            const els = document.querySelectorAll(s);
+            if (els.length) { matched = s; return els[els.length - 1]; }
+        }
+        return null;
+    };
+    const stopVisible = () => stopSels.some(s => {
+        const e = document.querySelector(s);
+        return e && e.offsetParent !== null;
+    });
+    const base = find();
+    const baseLen = base ? base.textContent.length : 0;
+    const grown = (node) => {
+        if (!node) return false;
+        const before = node === base ? baseLen : 0;
+        return node.textContent.length - before >= minChars;
+    };
+    window.__aiclawDone = new Promise(resolve => {
+        let quietTimer = null, sawStop = false, done = false, obs = null, hard = null;
+        const finish = (reason) => {
+            if (done) return;
+            done = true;
+            if (obs) obs.disconnect();
+            clearTimeout(quietTimer); clearTimeout(hard);
+            const n = find();
+            resolve({reason, ms: Math.round(performance.now() - t0),
+                     chars: n ? n.textContent.length : 0, sel: matched});
+        };
+        const check = () => {
+            const node = find();
+            if (stopVisible()) sawStop = true;
+            else if (sawStop && grown(node)) { finish("stop_gone"); return; }
+            clearTimeout(quietTimer);
+            if (grown(node)) quietTimer = setTimeout(() => finish("quiet"), quietMs);
+        };
+        obs = new MutationObserver(check);
+        obs.observe(document.body, {subtree: true, childList: true, characterData: true});
+        hard = setTimeout(() => finish("timeout"), timeoutMs);
+        check();
+    });
+    return true;
+}
+"""
+
+async def _arm_completion(page, answer_sels: list, stop_sels: list,
+                          quiet_ms=2500, timeout_s=60, min_chars=200):
+    """Install the completion detector. Call BEFORE submitting the prompt."""
+    await page.evaluate(_ARM_COMPLETION_JS, {
+        "answerSels": answer_sels, "stopSels": stop_sels,
+        "quietMs": quiet_ms, "timeoutMs": int(timeout_s * 1000), "minChars": min_chars,
+    })
+
+async def _await_completion(page, quiet_ms=3000, timeout_s=45) -> dict:
+    """Await the armed detector; returns {"reason", "ms", "chars", "sel"}.
+    If the detector is lost (navigation, destroyed execution context) the
+    page text is polled until it stops growing for `quiet_ms`, bounded by
+    `timeout_s`, so the caller never reads a half-streamed answer."""
+    t0 = time.monotonic()
+    try:
+        return await page.evaluate("() => window.__aiclawDone")
+    except Exception as e:
+        reason = f"error: {e}"
+    chars = await _poll_text_quiet(page, quiet_ms, timeout_s)
+    return {"reason": reason, "ms": round((time.monotonic() - t0) * 1000),
+            "chars": chars, "sel": None}
+
+async def _poll_text_quiet(page, quiet_ms: int, timeout_s: float) -> int:
+    """Fallback wait: poll document.body text length until it is unchanged
+    for `quiet_ms` or `timeout_s` passes. Returns the last length seen."""
+    deadline, last, since = time.monotonic() + timeout_s, -1, None
+    while time.monotonic() < deadline:
         try:
-            el = await page.wait_for_selector(sel, timeout=timeout)
-            if el:
-                return (await el.inner_text()).strip()
+            cur = await page.evaluate("document.body ? document.body.innerText.length : 0")
         except Exception:
-            continue
-    return ""
+            cur = -1        # mid-navigation; keep waiting
+        now = time.monotonic()
+        if cur != last or cur <= 0:
+            last, since = cur, now
+        elif now - since >= quiet_ms / 1000:
+            break
+        await asyncio.sleep(0.5)
+    return max(last, 0)
 
 async def _wait_stream_stop(page, sel: str, stable_ms=3000, timeout_s=55):
     """
-    Poll a selector until its text stops growing for `stable_ms` ms,
-    or until `timeout_s` seconds have passed.
+    Wait until the text under `sel` stops changing for `stable_ms` ms (or
+    `timeout_s` passes) and return it. Event-driven — no polling.
     """
-    deadline = time.time() + timeout_s
-    last_len  = -1
-    stable_since = None
-    while time.time() < deadline:
-        try:
-            txt = await page.inner_text(sel)
-            cur_len = len(txt)
-            if cur_len == last_len:
-                if stable_since is None:
-                    stable_since = time.time()
-                elif time.time() - stable_since >= stable_ms / 1000:
-                    return txt
-            else:
-                last_len     = cur_len
-                stable_since = None
-        except Exception:
-            pass
-        await asyncio.sleep(0.7)
-    # Return whatever we have
     try:
+        await _arm_completion(page, [sel], [], quiet_ms=stable_ms,
+                              timeout_s=timeout_s, min_chars=0)
+        await _await_completion(page, stable_ms, timeout_s)
         return await page.inner_text(sel)
     except Exception:
         return ""
@@ -611,6 +2196,133 @@ def _is_login_wall(url: str) -> bool:
     return any(k in lowers for k in ("login", "signin", "sign-in", "auth", "accounts.google"))
 
 
+# ── Provider selector registry ────────────────────────────────────────────────
+# DEFAULT_PROVIDERS lists candidate selectors per model and kind: input, submit,
+# response (answer node; `body` is the last resort so completion detection
+# degrades to whole-page quiet), stop ("stop generating" control), sources.
+# Hit/miss/latency counters live in selector_stats and reorder the candidates
+# so the selector that has been winning is tried (and wins ties) first.
+# Whole-page fallbacks (FALLBACK_SELECTORS) always match, so they stay pinned
+# at the end and are never ranked. An optional providers.json next to app.py
+# (not shipped) replaces individual lists without a redeploy, e.g.
+#   {"Claude": {"input": ["div.ProseMirror", "textarea"]}}
+PROVIDERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "providers.json")
+SELECTOR_KINDS = ("input", "submit", "response", "stop", "sources")
+FALLBACK_SELECTORS = ("main", "body")
+DEFAULT_PROVIDERS = {
+    "Perplexity": {
+        "input": [
+            "textarea[placeholder]", "textarea", '[contenteditable="true"]',
+            'input[type="text"]',
+        ],
+        "submit": [],
+        "response": ['[id^="markdown-content"]', ".prose", "main", "body"],
+        "stop": ['button[aria-label*="Stop"]'],
+        "sources": ['a[href^="http"]'],
+    },
+    "Gemini": {
+        "input": [
+            'rich-textarea [contenteditable="true"]', '[contenteditable="true"]',
+            '[role="textbox"]', "rich-textarea",
+        ],
+        "submit": [],
+        "response": [
+            "model-response", "[data-response-index]", ".response-content",
+            "message-content", "body",
+        ],
+        "stop": ['button[aria-label*="Stop"]', ".stop-icon"],
+        "sources": ['a[href^="http"]'],
+    },
+    "Claude": {
+        "input": [
+            '[data-testid="chat-input"]', "div.ProseMirror", '[contenteditable="true"]',
+            '[role="textbox"]', "textarea",
+        ],
+        "submit": [
+            'button[aria-label="Send message"]', 'button[aria-label="Send"]',
+            'button[type="submit"]', '[data-testid="send-button"]',
+        ],
+        "response": ["[data-is-streaming]", ".font-claude-message", "body"],
+        "stop": ['button[aria-label="Stop response"]', 'button[aria-label*="Stop"]'],
+        "sources": ['a[href^="http"]'],
+    },
+}
+_REGISTRY = {"mtime": None, "data": DEFAULT_PROVIDERS}
+
+def load_provider_registry() -> dict:
+    """DEFAULT_PROVIDERS with providers.json overrides applied per model and
+    kind, re-read only when the file changes. A missing or broken file leaves
+    the last good copy."""
+    try:
+        mtime = os.path.getmtime(PROVIDERS_PATH)
+        if mtime != _REGISTRY["mtime"]:
+            with open(PROVIDERS_PATH, encoding="utf-8") as f:
+                conf = json.load(f)
+            _REGISTRY["data"] = {m: {**DEFAULT_PROVIDERS.get(m, {}), **conf.get(m, {})}
+                                 for m in {**DEFAULT_PROVIDERS, **conf}}
+            _REGISTRY["mtime"] = mtime
+    except Exception:
+        pass    # keep the last good copy (the built-in defaults on first load)
+    return _REGISTRY["data"]
+
+def _selector_rank_key(stats: dict):
+    hits, misses, total_ms = stats
+    hit_rate = (hits + 1) / (hits + misses + 2)         # Laplace prior: new = 0.5
+    avg_ms   = total_ms / hits if hits else float("inf")
+    return (-round(hit_rate, 2), avg_ms)
+
+def provider_selectors(model: str) -> dict:
+    """{kind: [selectors]} for `model`, best-performing candidates first."""
+    conf  = load_provider_registry().get(model, {})
+    stats = load_selector_stats(model)
+    out = {}
+    for kind in SELECTOR_KINDS:
+        cands = list(conf.get(kind, []))
+        tail  = [c for c in cands if c in FALLBACK_SELECTORS]
+        # sorted() is stable, so registry order breaks ties
+        out[kind] = sorted((c for c in cands if c not in FALLBACK_SELECTORS),
+                           key=lambda s: _selector_rank_key(stats.get((kind, s), (0, 0, 0.0))))
+        out[kind] += tail
+    return out
+
+def record_selector_race(model: str, kind: str, candidates: list, winner, elapsed_ms=0.0):
+    """Winner gets a hit and its latency; candidates ranked above it (expected
+    to win but didn't) get a miss. No winner = a miss for every candidate.
+    FALLBACK_SELECTORS are unranked, so they are never counted."""
+    if winner in candidates:
+        misses = candidates[:candidates.index(winner)]
+    else:
+        misses, winner = list(candidates), None
+    misses = [c for c in misses if c not in FALLBACK_SELECTORS]
+    if winner in FALLBACK_SELECTORS:
+        winner = None
+    if winner is None and not misses:
+        return
+    save_selector_stats(model, kind, winner, elapsed_ms or 0.0, misses)
+
+async def _record_completion(r: dict, done: dict, model: str = "",
+                             answer_sels: list | None = None):
+    r["timing"] = {"completion_ms": done.get("ms"), "completion_reason": done.get("reason")}
+    if model and answer_sels:
+        r.setdefault("selectors", {})["response"] = done.get("sel")
+        await asyncio.to_thread(record_selector_race, model, "response", answer_sels,
+                                done.get("sel"), done.get("ms"))
+
+async def _collect_sources(page, model: str, selectors: list, exclude: str) -> list:
+    """Outbound links from the first source selector that yields any."""
+    for sel in selectors:
+        try:
+            links = await page.eval_on_selector_all(sel, "els => els.map(e => e.href)")
+        except Exception:
+            continue
+        links = [l for l in links if exclude not in l]
+        if links:
+            await asyncio.to_thread(record_selector_race, model, "sources", selectors, sel)
+            return links[:15]
+    await asyncio.to_thread(record_selector_race, model, "sources", selectors, None)
+    return []
+
+
 # ── ChatGPT ──────────────────────────────────────────────────────────────────
 async def query_perplexity(context, prompt: str) -> dict:
     """Query Perplexity.ai without login — works reliably in headless mode."""
@@ -618,51 +2330,24 @@ async def query_perplexity(context, prompt: str) -> dict:
     r = {"model":"Perplexity","prompt":prompt,"response":"","sources":[],"mock":False,"error":None}
     try:
         await page.goto("https://www.perplexity.ai/", wait_until="domcontentloaded", timeout=30000)
-        await page.wait_for_timeout(3000)
 
-        # Perplexity input selectors
-        INPUT_SELS = [
-            'textarea[placeholder]',
-            'textarea',
-            '[contenteditable="true"]',
-            'input[type="text"]',
-        ]
-        filled = False
-        for sel in INPUT_SELS:
-            try:
-                el = await page.wait_for_selector(sel, timeout=6000, state="visible")
-                await el.click()
-                await page.keyboard.type(prompt, delay=30)
-                filled = True
-                break
-            except Exception:
-                continue
+        sels = await asyncio.to_thread(provider_selectors, "Perplexity")
+        input_sel, race_ms = await _race_click_type(page, sels["input"], prompt, delay=30)
+        await asyncio.to_thread(record_selector_race, "Perplexity", "input", sels["input"],
+                                input_sel, race_ms)
+        r["selectors"] = {"input": input_sel}
 
-        if not filled:
+        if not input_sel:
             r["error"] = "input_not_found"
             r["response"] = "[Could not find Perplexity input field]"
             return r
 
+        # Perplexity streams fast, usually 10-20s
+        await _arm_completion(page, sels["response"], sels["stop"],
+                              quiet_ms=3000, timeout_s=45, min_chars=300)
         await page.keyboard.press("Enter")
-        await page.wait_for_timeout(4000)
-
-        # Poll for stable response (Perplexity streams fast, usually 10-20s)
-        prev_len = 0
-        stable_count = 0
-        for _ in range(20):
-            await page.wait_for_timeout(2000)
-            try:
-                txt = await page.evaluate("document.body.innerText")
-                cur_len = len(txt)
-                if cur_len > 500 and cur_len == prev_len:
-                    stable_count += 1
-                    if stable_count >= 2:
-                        break
-                else:
-                    stable_count = 0
-                prev_len = cur_len
-            except Exception:
-                break
+        await _record_completion(r, await _await_completion(page, 3000, 45), "Perplexity",
+                                 sels["response"])
 
         # Extract response
         full_text = await page.evaluate("document.body.innerText")
@@ -678,13 +2363,7 @@ async def query_perplexity(context, prompt: str) -> dict:
                 r["response"] = r["response"][len(bp):].strip()
 
         # Sources — Perplexity shows citation links
-        try:
-            links = await page.eval_on_selector_all(
-                'a[href^="http"]', "els => els.map(e => e.href)"
-            )
-            r["sources"] = [l for l in links if "perplexity.ai" not in l][:15]
-        except Exception:
-            pass
+        r["sources"] = await _collect_sources(page, "Perplexity", sels["sources"], "perplexity.ai")
 
     except Exception as e:
         r["error"] = str(e)
@@ -700,7 +2379,6 @@ async def query_gemini(context, prompt: str) -> dict:
     r = {"model":"Gemini","prompt":prompt,"response":"","sources":[],"mock":False,"error":None}
     try:
         await page.goto("https://gemini.google.com/app", wait_until="domcontentloaded", timeout=30000)
-        await page.wait_for_timeout(3000)
 
         if _is_login_wall(page.url):
             r["error"] = "login_required"
@@ -708,73 +2386,31 @@ async def query_gemini(context, prompt: str) -> dict:
             return r
 
         # Gemini uses rich-textarea with contenteditable div inside
-        INPUT_SELS = [
-            'rich-textarea [contenteditable="true"]',
-            '[contenteditable="true"]',
-            '[role="textbox"]',
-            'rich-textarea',
-        ]
-        filled = False
-        for sel in INPUT_SELS:
-            try:
-                el = await page.wait_for_selector(sel, timeout=6000)
-                await el.click()
-                await page.keyboard.type(prompt, delay=35)
-                filled = True
-                break
-            except Exception:
-                continue
-
-        if not filled:
+        sels = await asyncio.to_thread(provider_selectors, "Gemini")
+        input_sel, race_ms = await _race_click_type(page, sels["input"], prompt, delay=35)
+        await asyncio.to_thread(record_selector_race, "Gemini", "input", sels["input"],
+                                input_sel, race_ms)
+        r["selectors"] = {"input": input_sel}
+
+        if not input_sel:
+            if _is_login_wall(page.url):
+                r["error"] = "login_required"
+                r["response"] = "[Login required — Gemini redirected to Google login]"
+                return r
             r["error"] = "input_not_found"
             r["response"] = "[Could not find Gemini input field]"
             return r
 
+        # Gemini streams — resolve once the model-response node goes quiet
+        await _arm_completion(page, sels["response"], sels["stop"],
+                              quiet_ms=3000, timeout_s=60, min_chars=300)
         await page.keyboard.press("Enter")
-        # Wait for Gemini to start generating — look for response content appearing
-        await page.wait_for_timeout(4000)
-        # Poll until response content grows and then stabilizes (Gemini streams)
-        prev_len = 0
-        stable_count = 0
-        for _ in range(30):   # up to 60s total
-            await page.wait_for_timeout(2000)
-            try:
-                # Get only the model response text, not the full page
-                resp_text = await page.evaluate("""
-                    () => {
-                        // Try to get model response elements specifically
-                        const selectors = [
-                            'model-response',
-                            '[data-response-index]',
-                            '.response-content',
-                            'message-content'
-                        ];
-                        for (const sel of selectors) {
-                            const els = document.querySelectorAll(sel);
-                            if (els.length > 0) {
-                                return Array.from(els).map(e => e.innerText).join('\\n');
-                            }
-                        }
-                        // Fallback: get body text
-                        return document.body.innerText;
-                    }
-                """)
-                cur_len = len(resp_text)
-                if cur_len > 300 and cur_len == prev_len:
-                    stable_count += 1
-                    if stable_count >= 2:
-                        break
-                elif cur_len > prev_len:
-                    stable_count = 0
-                prev_len = cur_len
-            except Exception:
-                break
+        done = await _await_completion(page, 3000, 60)
 
         try:
             # Extract using targeted selectors first, fall back to body text parsing
-            response_text = await page.evaluate("""
-                () => {
-                    const selectors = ['model-response', '[data-response-index]', '.response-content'];
+            EXTRACT_JS = """
+                (selectors) => {
                     for (const sel of selectors) {
                         const els = document.querySelectorAll(sel);
                         if (els.length > 0) {
@@ -785,12 +2421,18 @@ async def query_gemini(context, prompt: str) -> dict:
                     // Fall back: body text after the prompt
                     return document.body.innerText;
                 }
-            """)
+            """
+            response_text = await page.evaluate(
+                EXTRACT_JS, [s for s in sels["response"] if s != "body"])
             # If we got body text, strip out the UI chrome and get just the response
             if len(response_text) < 200:
-                # Wait more and try again
-                await page.wait_for_timeout(8000)
+                # Give a slow start one more quiet window, then read the whole page
+                await _arm_completion(page, sels["response"], sels["stop"],
+                                      quiet_ms=3000, timeout_s=8, min_chars=1)
+                again = await _await_completion(page, 3000, 8)
+                done  = {**again, "ms": (done.get("ms") or 0) + (again.get("ms") or 0)}
                 response_text = await page.evaluate("document.body.innerText")
+            await _record_completion(r, done, "Gemini", sels["response"])
 
             # Extract response part (after the prompt)
             prompt_idx = response_text.find(prompt[:40])
@@ -810,14 +2452,7 @@ async def query_gemini(context, prompt: str) -> dict:
             r["response"] = f"[Error extracting response: {e}]"
 
         # sources
-        try:
-            links = await page.eval_on_selector_all(
-                'a[href^="http"]',
-                "els => els.map(e => e.href)"
-            )
-            r["sources"] = [l for l in links if "google.com" not in l][:15]
-        except Exception:
-            pass
+        r["sources"] = await _collect_sources(page, "Gemini", sels["sources"], "google.com")
 
     except Exception as e:
         r["error"] = str(e)
@@ -833,69 +2468,47 @@ async def query_claude(context, prompt: str) -> dict:
     r = {"model":"Claude","prompt":prompt,"response":"","sources":[],"mock":False,"error":None}
     try:
         await page.goto("https://claude.ai/new", wait_until="domcontentloaded", timeout=30000)
-        await page.wait_for_timeout(3000)
 
         if _is_login_wall(page.url):
             r["error"] = "login_required"
             r["response"] = "[Login required — Claude redirected to login page]"
             return r
 
-        # Claude: use same stable approach as Gemini - type then poll for response
-        INPUT_SELS = [
-            '[data-testid="chat-input"]',
-            'div.ProseMirror',
-            '[contenteditable="true"]',
-            '[role="textbox"]',
-            'textarea',
-        ]
-        filled = False
-        for sel in INPUT_SELS:
-            try:
-                el = await page.wait_for_selector(sel, timeout=6000)
-                await el.click()
-                await page.keyboard.type(prompt, delay=35)
-                filled = True
-                break
-            except Exception:
-                continue
-
-        if not filled:
+        # Claude: use same stable approach as Gemini - type then wait for the answer
+        sels = await asyncio.to_thread(provider_selectors, "Claude")
+        input_sel, race_ms = await _race_click_type(page, sels["input"], prompt, delay=35)
+        await asyncio.to_thread(record_selector_race, "Claude", "input", sels["input"],
+                                input_sel, race_ms)
+        r["selectors"] = {"input": input_sel}
+
+        if not input_sel:
+            if _is_login_wall(page.url):
+                r["error"] = "login_required"
+                r["response"] = "[Login required — Claude redirected to login page]"
+                return r
             r["error"] = "input_not_found"
             r["response"] = "[Could not find Claude input field]"
             return r
 
+        await _arm_completion(page, sels["response"], sels["stop"],
+                              quiet_ms=3000, timeout_s=55, min_chars=300)
+
         # Click send button or press Enter
-        sent = False
-        for btn_sel in ['button[aria-label="Send message"]', 'button[aria-label="Send"]',
-                        'button[type="submit"]', '[data-testid="send-button"]']:
+        t0 = time.monotonic()
+        btn, btn_sel = await _race_selectors(page, sels["submit"], timeout=2000)
+        if btn is not None:
             try:
-                btn = await page.wait_for_selector(btn_sel, timeout=2000, state="visible")
                 await btn.click()
-                sent = True
-                break
             except Exception:
-                continue
-        if not sent:
+                btn_sel = None
+        await asyncio.to_thread(record_selector_race, "Claude", "submit", sels["submit"],
+                                btn_sel, (time.monotonic() - t0) * 1000)
+        if btn_sel is None:
             await page.keyboard.press("Return")
+        r["selectors"]["submit"] = btn_sel
 
-        # Poll for stable response
-        await page.wait_for_timeout(3000)
-        prev_len = 0
-        stable_count = 0
-        for _ in range(25):
-            await page.wait_for_timeout(2000)
-            try:
-                txt = await page.evaluate("document.body.innerText")
-                cur_len = len(txt)
-                if cur_len == prev_len and cur_len > 500:
-                    stable_count += 1
-                    if stable_count >= 2:
-                        break
-                else:
-                    stable_count = 0
-                prev_len = cur_len
-            except Exception:
-                break
+        await _record_completion(r, await _await_completion(page, 3000, 55), "Claude",
+                                 sels["response"])
 
         try:
             full_text = await page.evaluate("document.body.innerText")
@@ -907,13 +2520,7 @@ async def query_claude(context, prompt: str) -> dict:
         except Exception as e:
             r["response"] = f"[Error extracting response: {e}]"
 
-        try:
-            links = await page.eval_on_selector_all(
-                'a[href^="http"]', "els => els.map(e => e.href)"
-            )
-            r["sources"] = [l for l in links if "claude.ai" not in l][:15]
-        except Exception:
-            pass
+        r["sources"] = await _collect_sources(page, "Claude", sels["sources"], "claude.ai")
 
     except Exception as e:
         r["error"] = str(e)
@@ -989,134 +2596,810 @@ def mock_response(model: str, prompt: str, brand: str, domain: str, competitors:
     }
 
 
+# ── Rate limiting ─────────────────────────────────────────────────────────────
+# Rates are prompts per second. The defaults match the old random 6–12 s pause.
+LIMITER_DEFAULTS = {
+    "rate": 1 / 9, "burst": 1,
+    "min_rate": 1 / 90, "max_rate": 1 / 4,
+    "speedup": 1.15,         # rate multiplier after HEALTHY_STREAK good responses
+    "slowdown": 0.5,         # rate multiplier on a bad response
+    "backoff_base_s": 15, "backoff_max_s": 300,
+    "jitter": 0.2,           # ± fraction added to every wait (less robotic)
+}
+HEALTHY_STREAK = 3
+
+_THROTTLE_MARKERS = ("too many requests", "rate limit", "unusual traffic",
+                     "something went wrong", "try again later", "verify you are human",
+                     "are you a robot", "captcha")
+
+def result_health(res: dict) -> str:
+    """Classify a raw result as ok / login_wall / error / empty for the limiter."""
+    if res.get("error") == "login_required":
+        return "login_wall"
+    if res.get("error"):
+        return "error"
+    text = (res.get("response") or "").strip()
+    if len(text) < 50:
+        return "empty"
+    if any(m in text[:600].lower() for m in _THROTTLE_MARKERS):
+        return "error"
+    return "ok"
+
+
+# ── Cross-brand answer cache ─────────────────────────────────────────────────
+ANSWER_TTL_H = float(os.environ.get("AICLAW_ANSWER_TTL_H", "24"))
+_BRAND_FIELDS = ("brand", "domain", "competitors")
+_RUN_FIELDS   = ("timing", "selectors")     # describe the browser run, not the answer
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9$€£%]+", prompt.lower()))
+
+class AnswerCache:
+    """Provider answers keyed by (model, normalized prompt, country). The
+    answer to a category prompt doesn't depend on which brand is being
+    scored, so a fresh hit replaces the browser query and is re-parsed for
+    the current brand. ttl_h <= 0 disables it."""
+
+    def __init__(self, country: str, ttl_h: float = ANSWER_TTL_H):
+        self.country, self.ttl_h = country, ttl_h
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_h > 0
+
+    def get(self, model: str, prompt: str, brand: str, domain: str,
+            competitors: list) -> dict | None:
+        if not self.enabled:
+            return None
+        hit = load_answer(model, normalize_prompt(prompt), self.country, self.ttl_h * 3600)
+        if not hit:
+            return None
+        res, age_s = hit
+        for k in _RUN_FIELDS:
+            res.pop(k, None)        # rows cached before these were stripped on put()
+        res.update({"prompt": prompt, "brand": brand, "domain": domain,
+                    "competitors": competitors, "answer_cache_age_s": age_s})
+        return res
+
+    def put(self, res: dict):
+        if self.enabled and not res.get("mock") and result_health(res) == "ok" \
+                and "answer_cache_age_s" not in res:
+            save_answer(res["model"], normalize_prompt(res["prompt"]), self.country,
+                        {k: v for k, v in res.items()
+                         if k not in _BRAND_FIELDS and k not in _RUN_FIELDS})
+
+
+class ProviderLimiter:
+    """
+    Adaptive token bucket for one provider.
+
+    Tokens refill at `rate`/s up to `burst`. A bad result halves the rate and
+    opens an exponential back-off window; HEALTHY_STREAK good results in a
+    row raise it again. Pacing runs from query *completion*: record() drops
+    any tokens that refilled while the query was in flight, so there is
+    always at least 1/rate seconds between the end of one query and the
+    start of the next. The learned rate and back-off level are stored in the
+    limiter_state table (save(), off the event loop) so the next run starts
+    from the last safe rate. Thread-safe and loop-agnostic: slots are
+    reserved under a lock and slept for outside it.
+
+    Every process on the same DB (UI session, job and cell workers) also
+    takes its start time from the provider_slots row, so two workers with
+    their own limiters still add up to one provider's pace, not two.
+    """
+
+    def __init__(self, model: str, **cfg):
+        self.model = model
+        self.cfg   = {**LIMITER_DEFAULTS, **cfg}
+        self.rate  = self.cfg["rate"]
+        self.backoff_level = 0
+        self.streak        = 0
+        self.cooldown_until = 0.0
+        self._tokens  = float(self.cfg["burst"])
+        self._updated = time.monotonic()
+        self._free_at = 0.0             # wall clock: shared slot held until (see save())
+        self._lock    = threading.Lock()
+
+    @classmethod
+    def load(cls, model: str, **cfg) -> "ProviderLimiter":
+        lim = cls(model, **cfg)
+        state = load_limiter_state(model)
+        if state:
+            lim.rate = min(lim.cfg["max_rate"], max(lim.cfg["min_rate"], state["rate"]))
+            lim.backoff_level = state["backoff_level"]
+        return lim
+
+    def _reserve(self) -> float:
+        """Take one token (possibly going into debt) and return seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.cfg["burst"]),
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+            wait = max(wait, self.cooldown_until - now)
+        if wait > 0:
+            wait *= 1 + random.uniform(-self.cfg["jitter"], self.cfg["jitter"])
+        return wait
+
+    def _reserve_shared(self, wait: float) -> float:
+        """Line up behind other processes' queries (blocking SQLite — to_thread)."""
+        now = time.time()
+        return max(0.0, claim_provider_slot(self.model, now + wait, 1 / self.rate) - now)
+
+    async def acquire(self, log=None):
+        wait = await asyncio.to_thread(self._reserve_shared, self._reserve())
+        if wait > 0:
+            if log:
+                log(f"  ⏳ [{self.model}] Waiting {wait:.1f}s (1 per {1/self.rate:.0f}s) ...")
+            await asyncio.sleep(wait)
+
+    def record(self, res: dict, log=None) -> str:
+        """Feed a finished query back: restart the gap to the next query and
+        adapt the rate. In memory only — persist with save()."""
+        health = result_health(res)
+        with self._lock:
+            self._tokens  = min(self._tokens, 0.0)     # time spent querying isn't a pause
+            self._updated = time.monotonic()
+            if health == "ok":
+                self.streak += 1
+                if self.streak >= HEALTHY_STREAK:
+                    self.streak = 0
+                    old = self.rate
+                    self.rate = min(self.cfg["max_rate"], self.rate * self.cfg["speedup"])
+                    self.backoff_level = max(0, self.backoff_level - 1)
+                    if log and self.rate > old:
+                        log(f"  🐇 [{self.model}] Healthy streak — speeding up to 1 per {1/self.rate:.0f}s")
+            else:
+                self.streak = 0
+                self.rate = max(self.cfg["min_rate"], self.rate * self.cfg["slowdown"])
+                pause = min(self.cfg["backoff_max_s"],
+                            self.cfg["backoff_base_s"] * 2 ** self.backoff_level)
+                self.backoff_level += 1
+                self.cooldown_until = time.monotonic() + pause
+                if log:
+                    log(f"  🐢 [{self.model}] {health.replace('_', ' ')} — backing off {pause:.0f}s, "
+                        f"rate now 1 per {1/self.rate:.0f}s")
+            self._free_at = time.time() + max(1 / self.rate,
+                                              self.cooldown_until - time.monotonic())
+        return health
+
+    def save(self):
+        """Persist the learned rate and hold the shared slot for this query's
+        gap or back-off (blocking SQLite writes — run via to_thread)."""
+        with self._lock:
+            rate, level, free_at = self.rate, self.backoff_level, self._free_at
+        save_limiter_state(self.model, rate, level)
+        if free_at:
+            hold_provider_slot(self.model, free_at)
+
+
+def make_limiters() -> dict:
+    return {m: ProviderLimiter.load(m) for m, _ in QUERY_FNS}
+
+
 # ── Orchestrator ──────────────────────────────────────────────────────────────
+QUERY_FNS = [
+    ("Perplexity", query_perplexity),
+    ("Gemini",     query_gemini),
+    ("Claude",     query_claude),
+]
+
+CHROMIUM_ARGS = [
+    "--no-sandbox", "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage", "--disable-gpu",
+    "--disable-blink-features=AutomationControlled",
+    "--window-size=1280,800",
+]
+
+
+def _error_result(model: str, prompt: str, response: str, err, brand, domain, competitors) -> dict:
+    return {
+        "model": model, "prompt": prompt,
+        "response": response, "sources": [],
+        "mock": False, "error": str(err),
+        "brand": brand, "domain": domain,
+        "competitors": competitors,
+    }
+
+async def _launch_browser(pw):
+    return await pw.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+
+# ── Network blocking profile ─────────────────────────────────────────────────
+# Applied per context via context.route(). Nothing here affects extracted text;
+# the per-provider allowlist keeps bot challenges and auth flows working.
+BLOCK_PROFILE = {
+    "resource_types": ["image", "media", "font"],
+    "hosts": [
+        "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+        "googlesyndication.com", "facebook.net", "connect.facebook.com",
+        "segment.io", "segment.com", "cdn.segment.com", "sentry.io",
+        "hotjar.com", "clarity.ms", "mixpanel.com", "amplitude.com",
+        "intercom.io", "intercomcdn.com", "datadoghq.com", "browser-intake",
+        "cookielaw.org", "onetrust.com", "bat.bing.com", "ads-twitter.com",
+        "linkedin.com/px", "snap.licdn.com",
+    ],
+    "allow": {
+        "Perplexity": ["challenges.cloudflare.com", "turnstile"],
+        "Gemini":     ["accounts.google.com", "recaptcha", "gstatic.com/recaptcha"],
+        "Claude":     ["challenges.cloudflare.com", "turnstile", "claude.ai/api"],
+    },
+}
+
+# Typical transfer sizes, used to estimate bytes saved by aborted requests
+_EST_BYTES = {"image": 30_000, "media": 250_000, "font": 45_000, "script": 35_000,
+              "xhr": 2_000, "fetch": 2_000, "ping": 500}
+
+class _RouteBlocker:
+    """context.route handler that aborts blocked requests and counts them."""
+
+    def __init__(self, model: str, profile: dict):
+        self.types = set(profile.get("resource_types", []))
+        self.hosts = list(profile.get("hosts", []))
+        self.allow = list(profile.get("allow", {}).get(model, []))
+        self.reset()
+
+    def reset(self):
+        self.blocked   = Counter()     # resource_type -> requests aborted
+        self.allowed   = 0
+        self.est_bytes = 0
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if any(a in url for a in self.allow):
+            return False
+        if resource_type in self.types:
+            return True
+        target = urlparse(url).netloc.lower() + urlparse(url).path
+        return any(h in target for h in self.hosts)
+
+    async def __call__(self, route):
+        req = route.request
+        try:
+            if self.should_block(req.url, req.resource_type):
+                self.blocked[req.resource_type] += 1
+                self.est_bytes += _EST_BYTES.get(req.resource_type, 5_000)
+                await route.abort("blockedbyclient")
+            else:
+                self.allowed += 1
+                await route.continue_()
+        except Exception:
+            pass    # page closed mid-request
+
+    def summary(self) -> dict:
+        return {"blocked": sum(self.blocked.values()), "allowed": self.allowed,
+                "est_bytes_saved": self.est_bytes, "by_type": dict(self.blocked)}
+
+def _fmt_bytes(n: float) -> str:
+    return f"{n/1_048_576:.1f} MB" if n >= 1_048_576 else f"{n/1024:.0f} KB"
+
+async def _new_context(browser, model: str = "", block_profile: dict | None = BLOCK_PROFILE):
+    """Fresh isolated context (own cookies/storage) with stealth patches if available.
+    When `block_profile` is set, non-text resources and trackers are aborted."""
+    context = await browser.new_context(
+        user_agent=random.choice(USER_AGENTS),
+        viewport={"width": 1280, "height": 800},
+        locale="en-US",
+        timezone_id="America/New_York",
+        extra_http_headers={
+            "Accept-Language": "en-US,en;q=0.9",
+            "sec-ch-ua": '"Chromium";v="122", "Not(A:Brand";v="24"',
+        }
+    )
+    if block_profile:
+        blocker = _RouteBlocker(model, block_profile)
+        await context.route("**/*", blocker)
+        context._aiclaw_blocker = blocker
+
+    # Try playwright_stealth if available
+    try:
+        from playwright_stealth import stealth_async
+    except ImportError:
+        return context
+    page_test = await context.new_page()
+    try:
+        await stealth_async(page_test)
+    except Exception:
+        pass
+    await page_test.close()
+    return context
+
+async def _run_provider(get_context, model_name: str, query_fn, prompts: list,
+                        brand: str, domain: str, competitors: list, tick, log,
+                        limiter: ProviderLimiter, on_result,
+                        answers: AnswerCache | None = None) -> list:
+    """Run every prompt against one provider, sequentially, paced by its limiter.
+    `prompts` may be a PromptFeed that is still being filled. Fresh answers
+    from `answers` are used without touching the browser; `get_context()` is
+    awaited for the context on the first cache miss. `on_result` is a
+    coroutine function awaited with each result."""
+    results, i = [], -1
+    async for prompt in _aiter_prompts(prompts):
+        i += 1
+        hit = answers and await asyncio.to_thread(
+            answers.get, model_name, prompt, brand, domain, competitors)
+        if hit:
+            log(f"  ♻️  [{model_name}] cached answer "
+                f"({hit['answer_cache_age_s']/3600:.1f}h old): {prompt[:55]}")
+            results.append(hit)
+            await on_result(hit)
+            tick()
+            continue
+        context = await get_context()
+        # Polite pacing — only blocks this provider's task
+        await limiter.acquire(log)
+        log(f"  [{model_name}] {i+1}/{len(prompts)}: {prompt[:65]}...")
+        try:
+            res = await query_fn(context, prompt)
+            res["brand"]       = brand
+            res["domain"]      = domain
+            res["competitors"] = competitors
+            results.append(res)
+
+            # Log outcome briefly
+            if res.get("error") == "login_required":
+                log(f"  ⚠️  [{model_name}] Login wall hit — marking as login_required")
+            elif res.get("error"):
+                log(f"  ⚠️  [{model_name}] Error: {res['error'][:80]}")
+            else:
+                preview = res["response"][:60].replace("\n"," ")
+                log(f"  OK [{model_name}] Got {len(res['response'])} chars: {preview[:60]}")
+
+        except Exception as e:
+            log(f"  ❌ [{model_name}] Unexpected error on prompt {i+1}: {e}")
+            results.append(_error_result(model_name, prompt, f"[Error: {e}]", e,
+                                         brand, domain, competitors))
+        limiter.record(results[-1], log)
+        await asyncio.to_thread(limiter.save)
+        if answers:
+            await asyncio.to_thread(answers.put, results[-1])
+        await on_result(results[-1])
+        tick()
+    return results
+
+def completion_timings(results: list) -> dict:
+    """Per-provider summary of how long response-completion detection took."""
+    by_model = {}
+    for r in results:
+        t = r.get("timing") or {}
+        if t.get("completion_ms") is None:
+            continue
+        d = by_model.setdefault(r["model"], {"ms": [], "reasons": Counter()})
+        d["ms"].append(t["completion_ms"])
+        d["reasons"][t.get("completion_reason")] += 1
+    return {
+        m: {"n": len(d["ms"]), "avg_ms": sum(d["ms"]) / len(d["ms"]),
+            "max_ms": max(d["ms"]), "reasons": dict(d["reasons"])}
+        for m, d in by_model.items()
+    }
+
+def _log_net_stats(net_stats: dict, log):
+    for model, s in net_stats.items():
+        log(f"🧱 {model}: blocked {s['blocked']} of {s['blocked'] + s['allowed']} requests "
+            f"(≈{_fmt_bytes(s['est_bytes_saved'])} saved)")
+    if len(net_stats) > 1:
+        blocked = sum(s["blocked"] for s in net_stats.values())
+        saved   = sum(s["est_bytes_saved"] for s in net_stats.values())
+        log(f"🧱 Run total: {blocked} requests blocked, ≈{_fmt_bytes(saved)} saved")
+
+async def _close_context(context):
+    try:
+        await context.close()
+    except Exception:
+        pass
+
+async def _run_provider_guarded(open_context, close_context, model_name: str, query_fn,
+                                prompts: list, brand: str, domain: str, competitors: list,
+                                tick, log, net_stats: dict, limiter: ProviderLimiter,
+                                on_result, answers: AnswerCache | None = None) -> list:
+    """Run the provider, opening a context via `open_context()` only once a
+    prompt misses the answer cache; on a launch failure fill the remaining
+    prompts with error rows so every (model, prompt) cell exists."""
+    done_here, opened = [], {}
+
+    async def get_context():
+        if "ctx" not in opened:
+            log(f"🤖 Starting {model_name} browser session ...")
+            ctx = await open_context()
+            blocker = getattr(ctx, "_aiclaw_blocker", None)
+            if blocker:
+                blocker.reset()     # pooled contexts carry counts from earlier runs
+            opened["ctx"] = ctx
+        return opened["ctx"]
+
+    async def _on_result(res: dict):
+        done_here.append(res)
+        await on_result(res)
+
+    try:
+        try:
+            return await _run_provider(get_context, model_name, query_fn, prompts,
+                                       brand, domain, competitors, tick, log, limiter,
+                                       _on_result, answers)
+        finally:
+            if "ctx" in opened:
+                blocker = getattr(opened["ctx"], "_aiclaw_blocker", None)
+                if blocker:
+                    net_stats[model_name] = blocker.summary()
+                await close_context(opened["ctx"])
+    except Exception as e:
+        log(f"❌ {model_name} browser launch failed: {e}")
+        out = list(done_here)
+        if isinstance(prompts, PromptFeed):
+            prompts = await asyncio.to_thread(prompts.wait)
+        for p in prompts[len(done_here):]:
+            out.append(_error_result(model_name, p, f"[Browser launch failed: {e}]", e,
+                                     brand, domain, competitors))
+            await on_result(out[-1])
+            tick()
+        return out
+
 async def run_live_queries(
     prompts: list, brand: str, domain: str, competitors: list,
-    progress_cb, log
+    progress_cb, log, concurrent: bool = True, pool=None,
+    block_profile: dict | None = BLOCK_PROFILE, limiters: dict | None = None,
+    run_id: str | None = None, skip: set | None = None, on_result=None,
+    answers: AnswerCache | None = None,
 ) -> list:
     """
-    Launch ONE browser per model; reuse the same page across prompts (faster,
-    less fingerprinting noise).  Falls back to mock on any unrecoverable error.
+    Query every provider with every prompt.
+
+    concurrent=True  — one shared Chromium; each provider runs as its own asyncio
+                       task with its own context and its own polite delays, so wall
+                       time is roughly the slowest provider rather than the sum.
+    concurrent=False — legacy mode: one browser per model, one model at a time.
+    pool             — a BrowserPool; contexts are borrowed warm instead of
+                       launched. Must then be awaited on the pool's own loop.
+    block_profile    — context.route blocking profile (None disables). Pooled
+                       contexts use the profile the pool was created with.
+    limiters         — {model: ProviderLimiter}; loaded from SQLite if omitted.
+    prompts          — a list, or a PromptFeed whose prompts are queried as they
+                       arrive (fresh runs only; `skip` is ignored).
+    run_id           — checkpoint every raw result to query_results as it lands.
+    skip             — {(model, prompt)} cells already done (resume); not re-queried.
+    on_result        — called with each raw result as soon as it arrives.
+    answers          — AnswerCache consulted before each browser query.
+
+    Falls back to mock (empty list) on any unrecoverable error.
     """
     if not HAS_PLAYWRIGHT:
         log("❌ Playwright not installed — using mock mode")
         return []
 
-    results = []
     log("🚀 Running: Perplexity + Gemini + Claude (ChatGPT skipped — Cloudflare blocks headless)")
-    total   = len(prompts) * 3
-    done    = 0
-
-    QUERY_FNS = [
-        ("Perplexity", query_perplexity),
-        ("Gemini",     query_gemini),
-        ("Claude",     query_claude),
-    ]
-
+    streaming = isinstance(prompts, PromptFeed)
+    skip  = set() if streaming else (skip or set())
+    total = (prompts.expected if streaming else len(prompts)) * len(QUERY_FNS)
+    state = {"done": sum(1 for m, _ in QUERY_FNS for p in prompts if (m, p) in skip)
+                     if skip else 0}
+    net_stats = {}
+    limiters  = limiters or make_limiters()
+    todo = {m: prompts if streaming else [p for p in prompts if (m, p) not in skip]
+            for m, _ in QUERY_FNS}
+    if skip:
+        log(f"♻️  Resuming — {state['done']}/{total} cells already checkpointed")
+
+    async def handle_result(res: dict):
+        if run_id:
+            await asyncio.to_thread(save_raw_result, run_id, res)
+        if on_result:
+            on_result(res)
+
+    def tick():
+        state["done"] += 1
+        progress_cb(min(state["done"] / max(total, 1), 1.0))
+
+    async def dispatch(open_for, close_context) -> list:
+        jobs = [
+            (lambda m=model_name: open_for(m), model_name, query_fn)
+            for model_name, query_fn in QUERY_FNS if streaming or todo[model_name]
+        ]
+        if concurrent:
+            log(f"⚡ Concurrent mode — {len(QUERY_FNS)} providers share one browser")
+            return await asyncio.gather(*[
+                _run_provider_guarded(open_context, close_context, model_name, query_fn,
+                                      todo[model_name], brand, domain, competitors, tick, log,
+                                      net_stats, limiters[model_name], handle_result, answers)
+                for open_context, model_name, query_fn in jobs
+            ])
+        out = []
+        for open_context, model_name, query_fn in jobs:
+            log(f"\n{'─'*40}")
+            out.append(await _run_provider_guarded(
+                open_context, close_context, model_name, query_fn,
+                todo[model_name], brand, domain, competitors, tick, log, net_stats,
+                limiters[model_name], handle_result, answers))
+        return out
+
+    per_model = []
     try:
-        # Try playwright_stealth if available
-        try:
-            from playwright_stealth import stealth_async
-            STEALTH = True
-        except ImportError:
-            STEALTH = False
-
-        async with async_playwright() as pw:
-            for model_name, query_fn in QUERY_FNS:
-                log(f"\n{'─'*40}")
-                log(f"🤖 Starting {model_name} browser session ...")
-                browser = None
-                try:
-                    browser = await pw.chromium.launch(
-                        headless=True,
-                        args=[
-                            "--no-sandbox", "--disable-setuid-sandbox",
-                            "--disable-dev-shm-usage", "--disable-gpu",
-                            "--disable-blink-features=AutomationControlled",
-                            "--window-size=1280,800",
-                        ]
-                    )
-                    context = await browser.new_context(
-                        user_agent=random.choice(USER_AGENTS),
-                        viewport={"width": 1280, "height": 800},
-                        locale="en-US",
-                        timezone_id="America/New_York",
-                        extra_http_headers={
-                            "Accept-Language": "en-US,en;q=0.9",
-                            "sec-ch-ua": '"Chromium";v="122", "Not(A:Brand";v="24"',
-                        }
-                    )
-
-                    # Apply stealth patches to context
-                    if STEALTH:
-                        page_test = await context.new_page()
-                        try:
-                            await stealth_async(page_test)
-                        except Exception:
-                            pass
-                        await page_test.close()
-
-                    for i, prompt in enumerate(prompts):
-                        log(f"  [{model_name}] {i+1}/{len(prompts)}: {prompt[:65]}...")
-                        try:
-                            res = await query_fn(context, prompt)
-                            res["brand"]       = brand
-                            res["domain"]      = domain
-                            res["competitors"] = competitors
-                            results.append(res)
-
-                            # Log outcome briefly
-                            if res.get("error") == "login_required":
-                                log(f"  ⚠️  Login wall hit — marking as login_required")
-                            elif res.get("error"):
-                                log(f"  ⚠️  Error: {res['error'][:80]}")
-                            else:
-                                preview = res["response"][:60].replace("\n"," ")
-                                log(f"  OK Got {len(res['response'])} chars: {preview[:60]}")
-
-                        except Exception as e:
-                            log(f"  ❌ Unexpected error on prompt {i+1}: {e}")
-                            results.append({
-                                "model": model_name, "prompt": prompt,
-                                "response": f"[Error: {e}]", "sources": [],
-                                "mock": False, "error": str(e),
-                                "brand": brand, "domain": domain,
-                                "competitors": competitors,
-                            })
-
-                        done += 1
-                        progress_cb(done / total)
-
-                        # Polite delay between prompts
-                        if i < len(prompts) - 1:
-                            delay = random.uniform(6, 12)
-                            log(f"  ⏳ Waiting {delay:.1f}s ...")
-                            await asyncio.sleep(delay)
-
-                except Exception as e:
-                    log(f"❌ {model_name} browser launch failed: {e}")
-                    # Fill remaining with errors
-                    for p in prompts[len([r for r in results if r['model']==model_name]):]:
-                        results.append({
-                            "model": model_name, "prompt": p,
-                            "response": f"[Browser launch failed: {e}]",
-                            "sources": [], "mock": False, "error": str(e),
-                            "brand": brand, "domain": domain,
-                            "competitors": competitors,
-                        })
-                        done += 1
-                        progress_cb(done / total)
-                finally:
-                    if browser:
+        if pool is not None:
+            per_model = await dispatch(pool.acquire, pool.release)
+        else:
+            async with async_playwright() as pw:
+                if concurrent:
+                    browser = await _launch_browser(pw)
+                    try:
+                        per_model = await dispatch(
+                            lambda m: _new_context(browser, m, block_profile), _close_context)
+                    finally:
                         await browser.close()
+                else:
+                    # One throwaway browser per model
+                    owned = {}
+                    async def open_own(model):
+                        browser = await _launch_browser(pw)
+                        ctx = await _new_context(browser, model, block_profile)
+                        owned[id(ctx)] = browser
+                        return ctx
+                    async def close_own(ctx):
+                        await _close_context(ctx)
+                        await owned.pop(id(ctx)).close()
+                    per_model = await dispatch(open_own, close_own)
 
     except Exception as e:
         log(f"❌ Playwright runtime error: {e}")
         return []
 
+    # Keep results grouped by model in QUERY_FNS order regardless of finish order
+    results = [r for model_results in per_model for r in model_results]
+    for model, t in completion_timings(results).items():
+        log(f"⏱️  {model}: completion detected in avg {t['avg_ms']/1000:.1f}s "
+            f"(max {t['max_ms']/1000:.1f}s) · {t['reasons']}")
+    _log_net_stats(net_stats, log)
     return results
 
 
+# ── Browser pool ──────────────────────────────────────────────────────────────
+POOL_RECYCLE_PAGES = 30     # retire a context after this many pages
+POOL_IDLE_PER_MODEL = 2     # warm contexts kept per provider
+
+class BrowserPool:
+    """
+    Process-wide warm Chromium owned by a long-lived background event loop.
+
+    Holds one browser plus pre-created contexts per provider. Contexts are
+    health-checked before being handed out and recycled after
+    POOL_RECYCLE_PAGES pages. Streamlit re-executes the script on every
+    rerun, so the instance lives in st.cache_resource (get_browser_pool).
+    """
+
+    def __init__(self, providers=None, recycle_after=POOL_RECYCLE_PAGES,
+                 block_profile=BLOCK_PROFILE):
+        self.providers     = providers or [m for m, _ in QUERY_FNS]
+        self.recycle_after = recycle_after
+        self.block_profile = block_profile
+        self.launches      = 0
+        self._pw      = None
+        self._browser = None
+        self._idle    = {}      # model -> [context, ...]
+        self._meta    = {}      # id(context) -> {"model", "browser", "pages"}
+        self._lock    = None
+        self.loop     = asyncio.new_event_loop()
+        self._thread  = threading.Thread(target=self._run_loop, name="aiclaw-browser-pool",
+                                         daemon=True)
+        self._thread.start()
+        self.submit(self.warm())
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self._lock = asyncio.Lock()
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the pool loop; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, make_coro, **callbacks):
+        """
+        Run `make_coro(**callbacks)` on the pool loop and block until it finishes.
+        Callback calls are queued and replayed on the *calling* thread, so
+        Streamlit placeholders are never touched from the pool thread.
+        """
+        calls = queue.Queue()
+        wrapped = {name: (lambda *a, _n=name: calls.put((_n, a))) for name in callbacks}
+        fut = self.submit(make_coro(**wrapped))
+        while True:
+            try:
+                name, args = calls.get(timeout=0.1)
+                callbacks[name](*args)
+                continue
+            except queue.Empty:
+                pass
+            if fut.done() and calls.empty():
+                return fut.result()
+
+    # ── coroutines below run on the pool loop ──
+    async def _ensure_browser(self):
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            self._idle, self._meta = {}, {}
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+            self._browser = await _launch_browser(self._pw)
+            self.launches += 1
+            return self._browser
+
+    async def _create(self, browser, model: str):
+        ctx  = await _new_context(browser, model, self.block_profile)
+        meta = {"model": model, "browser": browser, "pages": 0}
+        self._meta[id(ctx)] = meta
+        def _count(_page):
+            meta["pages"] += 1
+        ctx.on("page", _count)
+        ctx.on("close", lambda _c: self._meta.pop(id(ctx), None))
+        return ctx
+
+    def _usable(self, ctx) -> bool:
+        meta    = self._meta.get(id(ctx))
+        browser = self._browser
+        return (meta is not None and browser is not None and browser.is_connected()
+                and meta["browser"] is browser and meta["pages"] < self.recycle_after)
+
+    async def _healthy(self, ctx) -> bool:
+        if not self._usable(ctx):
+            return False
+        try:
+            await asyncio.wait_for(ctx.cookies(), timeout=3)
+            return True
+        except Exception:
+            return False
+
+    async def warm(self):
+        """Launch the browser and top up idle contexts for every provider."""
+        try:
+            browser = await self._ensure_browser()
+            for model in self.providers:
+                idle = self._idle.setdefault(model, [])
+                while len(idle) < 1:
+                    idle.append(await self._create(browser, model))
+        except Exception:
+            pass    # surfaced later by acquire()
+
+    async def acquire(self, model: str):
+        browser = await self._ensure_browser()
+        idle = self._idle.setdefault(model, [])
+        while idle:
+            ctx = idle.pop()
+            if await self._healthy(ctx):
+                return ctx
+            await _close_context(ctx)
+        return await self._create(browser, model)
+
+    async def release(self, ctx):
+        if not self._usable(ctx):
+            await _close_context(ctx)
+            asyncio.ensure_future(self.warm())     # replace the recycled context
+            return
+        idle = self._idle.setdefault(self._meta[id(ctx)]["model"], [])
+        if len(idle) >= POOL_IDLE_PER_MODEL:
+            await _close_context(ctx)
+        else:
+            idle.append(ctx)
+
+
+@st.cache_resource(show_spinner=False)
+def get_browser_pool() -> BrowserPool:
+    return BrowserPool()
+
+@st.cache_resource(show_spinner=False)
+def get_rate_limiters() -> dict:
+    """Process-wide limiters so concurrent analyses share each provider's budget."""
+    return make_limiters()
+
+
+# ── Distributed work queue ────────────────────────────────────────────────────
+# Step B split into (run_id, model, prompt) cells in the work_items table. Any
+# number of `python app.py --cell-worker` processes, on any host that can see
+# AICLAW_DB, lease cells, heartbeat while querying and write results into the
+# query_results checkpoint, which the coordinator reads back for Steps C–D.
+CELL_LEASE_S = 180
+CELL_POLL_S  = 2.0
+CELL_WAIT_S  = 3 * 3600     # coordinator gives up waiting after this long
+
+async def _hold_lease(item: dict, owner: str, lease_s: float):
+    while True:
+        await asyncio.sleep(lease_s / 3)
+        await asyncio.to_thread(heartbeat_work_item, item, owner, lease_s)
+
+async def _cell_provider_loop(pool, model: str, query_fn, owner: str,
+                              limiter: ProviderLimiter, log, exit_when_idle: bool):
+    while True:
+        if _orphaned():
+            log(f"[{model}] parent gone — exiting")
+            return
+        item = await asyncio.to_thread(claim_work_item, owner, CELL_LEASE_S, [model])
+        if item is None:
+            if exit_when_idle:
+                return
+            await asyncio.sleep(CELL_POLL_S)
+            continue
+        brand, domain, comps = item["brand"], item["domain"], item["competitors"]
+        answers = AnswerCache(item.get("country", ""), item.get("answer_ttl_h", 0))
+        hit = None if item["failed"] else await asyncio.to_thread(
+            answers.get, model, item["prompt"], brand, domain, comps)
+        if item["failed"]:
+            res = _error_result(model, item["prompt"], "[Gave up after repeated lease expiry]",
+                                "lease_exhausted", brand, domain, comps)
+        elif hit:
+            log(f"  ♻️  [{model}] {item['run_id']} · cached answer: {item['prompt'][:50]}")
+            res = hit
+        else:
+            await limiter.acquire(log)
+            log(f"  [{model}] {item['run_id']} · {item['prompt'][:60]}...")
+            hb = asyncio.ensure_future(_hold_lease(item, owner, CELL_LEASE_S))
+            ctx = None
+            try:
+                ctx = await pool.acquire(model)
+                res = await query_fn(ctx, item["prompt"])
+            except Exception as e:
+                res = _error_result(model, item["prompt"], f"[Error: {e}]", e, brand, domain, comps)
+            finally:
+                hb.cancel()
+                if ctx is not None:
+                    await pool.release(ctx)
+            res.update({"brand": brand, "domain": domain, "competitors": comps})
+            limiter.record(res, log)
+            await asyncio.to_thread(limiter.save)
+            await asyncio.to_thread(answers.put, res)
+        await asyncio.to_thread(complete_work_item, item, res)
+
+async def run_cell_worker_async(pool, owner: str, log, models: list | None = None,
+                                exit_when_idle: bool = False):
+    """One task per provider, each leasing cells for its own model."""
+    limiters = get_rate_limiters()
+    await asyncio.gather(*[
+        _cell_provider_loop(pool, m, fn, owner, limiters[m], log, exit_when_idle)
+        for m, fn in QUERY_FNS if not models or m in models
+    ])
+
+def run_cell_worker(owner: str | None = None, exit_when_idle: bool = False):
+    """Process entry point for `python app.py --cell-worker`."""
+    init_db()
+    owner = owner or f"{os.uname().nodename}:{os.getpid()}"
+    pool  = get_browser_pool()
+    def log(msg: str):
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {owner} {msg}", flush=True)
+    log("cell worker started")
+    pool.run(lambda log: run_cell_worker_async(pool, owner, log,
+                                               exit_when_idle=exit_when_idle), log=log)
+
+def run_distributed_queries(run_id: str, prompts: list, brand: str, domain: str,
+                            competitors: list, progress_cb, log, skip: set = frozenset(),
+                            on_result=None, answers: AnswerCache | None = None) -> list:
+    """Coordinator side: enqueue the run's cells, wait for cell workers to
+    finish them, and return every raw result for the run. `on_result` sees
+    each newly finished cell as it is noticed."""
+    models = [m for m, _ in QUERY_FNS]
+    context = {"brand": brand, "domain": domain, "competitors": competitors}
+    if answers:
+        context.update(country=answers.country, answer_ttl_h=answers.ttl_h)
+    queued = enqueue_work_items(run_id, prompts, models, context, skip)
+    cells  = {(m, p) for m in models for p in prompts if (m, p) not in skip}
+    total  = len(prompts) * len(models)
+    held   = f", {len(cells) - queued} still leased" if len(cells) > queued else ""
+    log(f"📤 Queued {queued} cells for cell workers ({total - len(cells)} already done{held})")
+    deadline, last, seen = time.time() + CELL_WAIT_S, -1, set(skip)
+    while time.time() < deadline:
+        done, n = work_progress(run_id, cells)
+        if done != last:
+            last = done
+            log(f"  📥 {done}/{n} cells finished")
+            progress_cb((total - n + done) / max(total, 1))
+            if on_result:
+                for r in load_raw_results(run_id):
+                    if (r["model"], r["prompt"]) not in seen:
+                        seen.add((r["model"], r["prompt"]))
+                        on_result(r)
+        if done >= n:
+            break
+        time.sleep(CELL_POLL_S)
+    else:
+        log("⚠️  Timed out waiting for cell workers — scoring what has arrived")
+    return load_raw_results(run_id)
+
+
 # ╔══════════════════════════════════════════════════════════════╗
 # ║  STEP C — PARSING ENGINE                                    ║
 # ╚══════════════════════════════════════════════════════════════╝
@@ -1204,6 +3487,7 @@ def parse_one(raw: dict) -> dict:
         "prompt":            raw.get("prompt"),
         "response":          response,
         "mock":              raw.get("mock", True),
+        "cached":            raw.get("answer_cache_age_s") is not None,
         "error":             raw.get("error"),
         "brand_mentioned":   brand_mentioned,
         "first_pos":         first_pos,
@@ -1221,93 +3505,198 @@ def parse_one(raw: dict) -> dict:
 # ╔══════════════════════════════════════════════════════════════╗
 # ║  STEP D — METRICS & SCORING                                 ║
 # ╚══════════════════════════════════════════════════════════════╝
-def compute_metrics(parsed: list) -> dict:
-    if not parsed:
-        return {}
-
-    brand  = parsed[0]["brand"]
-    domain = parsed[0]["domain"]
-    total  = len(parsed)
-
-    ment   = [r for r in parsed if r["brand_mentioned"]]
-    vis    = len(ment) / total * 100
-
-    positions = [r["first_pos"] for r in ment if r["first_pos"] > 0]
-    avg_pos   = sum(positions) / len(positions) if positions else 5.0
-
-    sents     = [r["sentiment"] for r in ment]
-    n_pos     = sents.count("positive")
-    n_neu     = sents.count("neutral")
-    n_neg     = sents.count("negative")
-    n_tot     = len(sents)
-    sent_score = (n_pos * 1.0 + n_neu * 0.5) / n_tot if n_tot else 0.5
-
-    own_count = sum(1 for r in parsed if r["own_cited"])
-    own_pct   = own_count / total * 100
-
-    all_cited = []
-    for r in parsed:
-        all_cited.extend(r["cited_domains"])
-    cit_rate = len(all_cited) / total
-
-    # Overall score
-    score = min(100, max(0,
-        0.40 * vis +
-        0.20 * max(0, 100 - avg_pos * 5) +
-        0.20 * sent_score * 100 +
-        0.20 * own_pct
-    ))
-
-    # Per-model (iterate actual data, not hardcoded model list)
-    per_model = {}
-    active_models = list(set(r["model"] for r in parsed))
-    for model in active_models:
-        mr = [r for r in parsed if r["model"] == model]
-        if not mr: continue
-        mt = len(mr)
-        mm = [r for r in mr if r["brand_mentioned"]]
-        mv = len(mm) / mt * 100
-        mp = [r["first_pos"] for r in mm if r["first_pos"] > 0]
-        ma = sum(mp) / len(mp) if mp else 5.0
-        ms = [r["sentiment"] for r in mm]
-        mss = ((ms.count("positive") * 1.0 + ms.count("neutral") * 0.5) / len(ms)) if ms else 0.5
-        mc = []; [mc.extend(r["cited_domains"]) for r in mr]
-        mown = sum(1 for r in mr if r["own_cited"]) / mt * 100
-        per_model[model] = {
-            "total": mt, "mentioned": len(mm), "visibility_pct": mv,
-            "avg_pos": ma, "sent_score": mss, "own_pct": mown,
-            "cit_rate": len(mc)/mt, "cited_domains": mc,
-            "pos": ms.count("positive"), "neu": ms.count("neutral"),
-            "neg": ms.count("negative"), "results": mr,
+class _Tally:
+    """Running counts for one slice of results (overall or one model)."""
+    def __init__(self):
+        self.total = self.mentioned = self.pos_sum = self.pos_n = 0
+        self.n_pos = self.n_neu = self.n_neg = self.own = self.n_cited = 0
+        self.results, self.cited = [], []
+
+    def add(self, r: dict):
+        self.total += 1
+        self.results.append(r)
+        self.cited.extend(r["cited_domains"])
+        self.n_cited += len(r["cited_domains"])
+        self.own += bool(r["own_cited"])
+        if r["brand_mentioned"]:
+            self.mentioned += 1
+            if r["first_pos"] > 0:
+                self.pos_sum += r["first_pos"]; self.pos_n += 1
+            s = r["sentiment"]
+            if s == "positive":   self.n_pos += 1
+            elif s == "neutral":  self.n_neu += 1
+            elif s == "negative": self.n_neg += 1
+
+    def merge(self, o: "_Tally"):
+        for k in ("total", "mentioned", "pos_sum", "pos_n", "n_pos", "n_neu",
+                  "n_neg", "own", "n_cited"):
+            setattr(self, k, getattr(self, k) + getattr(o, k))
+        self.results.extend(o.results)
+        self.cited.extend(o.cited)
+
+    def stats(self) -> tuple[float, float, float, float]:
+        """(visibility %, avg position, sentiment score, own-citation %)."""
+        vis     = self.mentioned / self.total * 100
+        avg_pos = self.pos_sum / self.pos_n if self.pos_n else 5.0
+        sent    = (self.n_pos * 1.0 + self.n_neu * 0.5) / self.mentioned if self.mentioned else 0.5
+        own_pct = self.own / self.total * 100
+        return vis, avg_pos, sent, own_pct
+
+
+class MetricsAccumulator:
+    """Online version of compute_metrics(): O(1) add() per parsed result,
+    merge() for shards from other workers, and snapshot() in the same shape
+    compute_metrics() returns. Snapshots share the result lists, so taking
+    one is cheap no matter how many results have been added."""
+
+    def __init__(self):
+        self.brand = self.domain = None
+        self.all = _Tally()
+        self.per_model: dict[str, _Tally] = {}
+        self.domains, self.comps = Counter(), Counter()
+        self.login_count = self.error_count = self.mock_count = 0
+
+    def add(self, r: dict) -> "MetricsAccumulator":
+        if self.brand is None:
+            self.brand, self.domain = r["brand"], r["domain"]
+        self.all.add(r)
+        self.per_model.setdefault(r["model"], _Tally()).add(r)
+        self.domains.update(r["cited_domains"])
+        self.comps.update(r["comp_mentions"])
+        err = r.get("error")
+        self.login_count += err == "login_required"
+        self.error_count += bool(err) and err != "login_required"
+        self.mock_count  += bool(r.get("mock"))
+        return self
+
+    def merge(self, other: "MetricsAccumulator") -> "MetricsAccumulator":
+        if self.brand is None:
+            self.brand, self.domain = other.brand, other.domain
+        self.all.merge(other.all)
+        for model, t in other.per_model.items():
+            self.per_model.setdefault(model, _Tally()).merge(t)
+        self.domains.update(other.domains)
+        self.comps.update(other.comps)
+        self.login_count += other.login_count
+        self.error_count += other.error_count
+        self.mock_count  += other.mock_count
+        return self
+
+    def snapshot(self) -> dict:
+        a = self.all
+        if not a.total:
+            return {}
+        vis, avg_pos, sent_score, own_pct = a.stats()
+
+        # Overall score
+        score = min(100, max(0,
+            0.40 * vis +
+            0.20 * max(0, 100 - avg_pos * 5) +
+            0.20 * sent_score * 100 +
+            0.20 * own_pct
+        ))
+
+        per_model = {}
+        for model, t in self.per_model.items():
+            mv, ma, mss, mown = t.stats()
+            per_model[model] = {
+                "total": t.total, "mentioned": t.mentioned, "visibility_pct": mv,
+                "avg_pos": ma, "sent_score": mss, "own_pct": mown,
+                "cit_rate": t.n_cited / t.total, "cited_domains": t.cited,
+                "pos": t.n_pos, "neu": t.n_neu, "neg": t.n_neg, "results": t.results,
+            }
+
+        top_domains = [{"domain": d, "count": c, "category": categorize(d)}
+                       for d, c in self.domains.most_common(20)]
+        top_comps   = [{"brand": b, "count": c}
+                       for b, c in self.comps.most_common(10)
+                       if b.lower() != self.brand.lower()]
+
+        return {
+            "brand": self.brand, "domain": self.domain, "total_queries": a.total,
+            "visibility_pct": vis, "avg_pos": avg_pos, "sent_score": sent_score,
+            "own_pct": own_pct, "cit_rate": a.n_cited / a.total, "score": score,
+            "n_pos": a.n_pos, "n_neu": a.n_neu, "n_neg": a.n_neg,
+            "per_model": per_model, "top_domains": top_domains,
+            "top_comps": top_comps, "parsed": a.results,
+            "login_count": self.login_count, "error_count": self.error_count,
+            "mock_count": self.mock_count,
         }
 
-    # Top domains & competitors
-    dom_counts  = Counter(all_cited)
-    top_domains = [{"domain": d, "count": c, "category": categorize(d)}
-                   for d, c in dom_counts.most_common(20)]
 
-    all_comps = []
-    for r in parsed: all_comps.extend(r["comp_mentions"])
-    comp_counts = Counter(all_comps)
-    top_comps   = [{"brand": b, "count": c}
-                   for b, c in comp_counts.most_common(10)
-                   if b.lower() != brand.lower()]
-
-    # Login-wall stats
-    login_count = sum(1 for r in parsed if r.get("error") == "login_required")
-    error_count = sum(1 for r in parsed if r.get("error") and r.get("error") != "login_required")
-    mock_count  = sum(1 for r in parsed if r.get("mock"))
-
-    return {
-        "brand": brand, "domain": domain, "total_queries": total,
-        "visibility_pct": vis, "avg_pos": avg_pos, "sent_score": sent_score,
-        "own_pct": own_pct, "cit_rate": cit_rate, "score": score,
-        "n_pos": n_pos, "n_neu": n_neu, "n_neg": n_neg,
-        "per_model": per_model, "top_domains": top_domains,
-        "top_comps": top_comps, "parsed": parsed,
-        "login_count": login_count, "error_count": error_count,
-        "mock_count": mock_count,
-    }
+def compute_metrics(parsed: list) -> dict:
+    acc = MetricsAccumulator()
+    for r in parsed:
+        acc.add(r)
+    return acc.snapshot()
+
+def parse_compare_brands(text: str) -> list:
+    """Sidebar "Compare brands" lines → [[brand, domain], ...]. Each line is
+    "Brand — domain", "Brand, domain", a bare domain or a bare brand name."""
+    out, seen = [], set()
+    for line in (text or "").splitlines():
+        parts = [s.strip() for s in re.split(r"\s+[—–-]\s+|,|\|", line, maxsplit=1)]
+        parts = [s for s in parts if s]
+        if not parts:
+            continue
+        if len(parts) == 1:
+            tok = parts[0]
+            dom = extract_domain(tok if "://" in tok else f"https://{tok}") if "." in tok else ""
+            brand = brand_from_domain(dom) if dom else tok
+        else:
+            brand, dom = parts[0], parts[1]
+            dom = extract_domain(dom if "://" in dom else f"https://{dom}")
+        if brand.lower() not in seen:
+            seen.add(brand.lower())
+            out.append([brand, dom])
+    return out
+
+def add_compare_competitors(intel: dict, compare: list) -> dict:
+    """Count every compared brand as a competitor of the run's own brand, so
+    all brands in a comparison are parsed against the same rival set."""
+    own  = intel["brand"].lower()
+    have = {c.lower() for c in intel["competitors"]}
+    intel["competitors"] = list(intel["competitors"]) + \
+        [b for b, _ in compare if b.lower() != own and b.lower() not in have]
+    return intel
+
+def unbranded_prompts(prompts, brands: list) -> list:
+    """Prompts that name none of `brands` (by name or domain). Branded
+    prompts favour the brand they name, so comparisons use only these."""
+    marks = [m.lower() for b, d in brands for m in (b, d) if m]
+    return [p for p in prompts if not any(m in p.lower() for m in marks)]
+
+def compute_multi_brand(raw_results: list, brands: list, parsed: list | None = None) -> dict:
+    """Score every (brand, domain) in `brands` from one shared set of raw
+    results, each parsed against the run's competitors plus the other
+    brands. `parsed` — Step C rows for brands[0], the run's own brand — is
+    used as-is so that brand is scored exactly as in the main metrics."""
+    out = {}
+    for i, (brand, domain) in enumerate(brands):
+        acc = MetricsAccumulator()
+        if i == 0 and parsed is not None:
+            for p in parsed:
+                acc.add(p)
+        else:
+            others = [b for b, _ in brands if b.lower() != brand.lower()]
+            for r in raw_results:
+                comps = others + [c for c in r.get("competitors", []) if c not in others]
+                acc.add(parse_one({**r, "brand": brand, "domain": domain, "competitors": comps}))
+        out[brand] = acc.snapshot()
+    return out
+
+def brand_summary(m: dict) -> dict:
+    """compute_metrics() output without the per-result lists — what a
+    comparison needs, small enough to store with every run."""
+    if not m:
+        return {}
+    keep = ("brand", "domain", "total_queries", "visibility_pct", "avg_pos", "sent_score",
+            "own_pct", "cit_rate", "score", "n_pos", "n_neu", "n_neg", "top_comps")
+    return {**{k: m[k] for k in keep},
+            "top_domains": m["top_domains"][:10],
+            "per_model": {k: {f: v[f] for f in ("total", "mentioned", "visibility_pct",
+                                                "avg_pos", "sent_score", "own_pct")}
+                          for k, v in m["per_model"].items()}}
 
 def score_band(s: float) -> tuple[str, str, str]:
     """Returns (emoji, hex_color, label)."""
@@ -1443,11 +3832,76 @@ def chart_competitor_bar(top_comps: list) -> go.Figure:
     )
     return fig
 
+def chart_brand_compare(brands: dict) -> go.Figure:
+    if not brands:
+        return None
+    names = list(brands)
+    fig = go.Figure()
+    for key, label, color in (("score", "Score", "#3b82f6"),
+                              ("visibility_pct", "Visibility %", "#22c55e"),
+                              ("own_pct", "Own-site cited %", "#f59e0b")):
+        vals = [brands[b][key] for b in names]
+        fig.add_trace(go.Bar(x=names, y=vals, name=label, marker_color=color,
+                             text=[f"{v:.0f}" for v in vals], textposition="outside",
+                             textfont={"color": TEXT_COL}))
+    fig.update_layout(
+        **_base_layout(height=300),
+        barmode="group",
+        title={"text":"Brand Comparison","font":{"color":TEXT_COL,"size":13}},
+        xaxis={"tickfont":{"color":TEXT_COL}},
+        yaxis={"range":[0,115],"tickfont":{"color":TEXT_COL},"gridcolor":GRID_COL},
+        legend={"font":{"color":TEXT_COL},"bgcolor":CARD_BG,"orientation":"h","y":1.12},
+    )
+    return fig
+
 
 # ╔══════════════════════════════════════════════════════════════╗
 # ║  REPORT TABS                                                 ║
 # ╚══════════════════════════════════════════════════════════════╝
 
+# ── Live partial view ─────────────────────────────────────────────────────────
+def render_partial(p: dict, key: str = "partial"):
+    """Running score while Step B is still in flight (see partial_summary).
+    Inline runs redraw this several times per script run, so `key` must vary."""
+    if not p:
+        return
+    _, color, label = score_band(p["score"])
+    c1, c2, c3 = st.columns([1, 1.4, 1.4])
+    with c1:
+        st.metric("Partial Score", f"{p['score']:.0f}/100", help=f"{label} — so far")
+        st.metric("Visibility so far", f"{p['visibility_pct']:.0f}%")
+        st.caption(f"Based on {p['total_queries']} responses")
+    with c2:
+        _fig = chart_model_bars(p["per_model"])
+        if _fig:
+            st.plotly_chart(_fig, width="stretch", key=f"{key}_models")
+    with c3:
+        if p["top_domains"]:
+            st.markdown("**Top cited domains so far**")
+            st.dataframe(pd.DataFrame(p["top_domains"]), hide_index=True, width="stretch",
+                         key=f"{key}_domains")
+
+
+# ── Comparison tab (multi-brand runs) ─────────────────────────────────────────
+def tab_compare(m: dict):
+    brands = m.get("brands") or {}
+    n = next(iter(brands.values()), {}).get("total_queries", 0)
+    st.caption(f"{len(brands)} brands scored from the same {n} AI responses to unbranded "
+               "prompts only — prompts naming a brand would favour it. Scores here can "
+               "therefore differ from the Executive Summary, which uses every prompt.")
+    fig = chart_brand_compare(brands)
+    if fig:
+        st.plotly_chart(fig, width="stretch")
+    rows = [{"Brand": b, "Domain": v["domain"], "Score": round(v["score"]),
+             "Visibility %": round(v["visibility_pct"], 1),
+             "Avg position": round(v["avg_pos"], 1) if v["avg_pos"] else None,
+             "Sentiment": round(v["sent_score"], 2), "Own-site cited %": round(v["own_pct"], 1),
+             **{f"{k} vis %": round(pm["visibility_pct"], 1)
+                for k, pm in v["per_model"].items()}}
+            for b, v in sorted(brands.items(), key=lambda kv: -kv[1]["score"])]
+    st.dataframe(pd.DataFrame(rows), hide_index=True, width="stretch")
+
+
 # ── Tab 1: Executive Summary ──────────────────────────────────────────────────
 def tab_executive(m: dict):
     brand = m["brand"]
@@ -1850,7 +4304,8 @@ def tab_raw(m: dict):
             "Own Site":          "✅" if r["own_cited"] else "❌",
             "Competitors":       ", ".join(r["comp_mentions"][:3]) or "—",
             "Data Type":         "🟡 Mock" if r.get("mock") else (
-                                 "⚠️ Login" if r.get("error")=="login_required" else "🟢 Live"),
+                                 "⚠️ Login" if r.get("error")=="login_required" else
+                                 "♻️ Cached" if r.get("cached") else "🟢 Live"),
             "Response Preview":  r["response"][:120].replace("\n"," ")+"...",
         })
     df = pd.DataFrame(rows)
@@ -1873,10 +4328,7 @@ def tab_raw(m: dict):
 # ╔══════════════════════════════════════════════════════════════╗
 # ║  ANALYSIS RUNNER (sync wrapper)                             ║
 # ╚══════════════════════════════════════════════════════════════╝
-def run_analysis(url: str, brand_override: str, num_prompts: int,
-                 use_browser: bool, log_lines: list,
-                 progress_ph, status_ph) -> tuple[dict,dict]:
-
+def _ui_callbacks(log_lines: list, progress_ph, status_ph):
     def log(msg: str):
         ts = datetime.now().strftime("%H:%M:%S")
         log_lines.append(f"[{ts}] {msg}")
@@ -1885,16 +4337,199 @@ def run_analysis(url: str, brand_override: str, num_prompts: int,
 
     def prog(v: float):
         progress_ph.progress(min(v, 1.0))
+    return log, prog
+
+PARTIAL_EVERY_S = 3.0     # min seconds between partial dashboard refreshes
+
+def partial_summary(m: dict) -> dict:
+    """Compact slice of compute_metrics() output for live progress views."""
+    if not m:
+        return {}
+    return {
+        "brand": m["brand"], "score": m["score"], "total_queries": m["total_queries"],
+        "visibility_pct": m["visibility_pct"], "sent_score": m["sent_score"],
+        "per_model": {k: {"visibility_pct": v["visibility_pct"], "mentioned": v["mentioned"],
+                          "total": v["total"]} for k, v in m["per_model"].items()},
+        "top_domains": m["top_domains"][:8],
+    }
+
+def run_answer_cache(params: dict) -> AnswerCache:
+    """AnswerCache for a run's saved params (older runs: country US, default TTL)."""
+    return AnswerCache(params.get("country", "US"), params.get("answer_ttl_h", ANSWER_TTL_H))
+
+def resumable_cells(saved: list) -> set:
+    """(model, prompt) cells whose checkpoint is worth keeping on resume —
+    errors and empty responses are re-queried."""
+    return {(r["model"], r["prompt"]) for r in saved
+            if result_health(r) in ("ok", "login_wall")}
+
+def run_analysis(url: str, brand_override: str, num_prompts: int,
+                 use_browser: bool, log_lines: list,
+                 progress_ph, status_ph, partial_ph=None,
+                 crawl_pages: int = CRAWL_PAGES, refresh_ai: bool = False,
+                 country: str = "US", answer_ttl_h: float = ANSWER_TTL_H,
+                 compare: list = ()) -> tuple[dict,dict]:
+    log, prog = _ui_callbacks(log_lines, progress_ph, status_ph)
+    return run_pipeline(url, brand_override, num_prompts, use_browser, log, prog,
+                        on_partial=_partial_renderer(partial_ph), crawl_pages=crawl_pages,
+                        refresh_ai=refresh_ai, country=country, answer_ttl_h=answer_ttl_h,
+                        compare=compare)
+
+def _partial_renderer(partial_ph):
+    if partial_ph is None:
+        return None
+    n = [0]
+    def on_partial(p: dict):
+        n[0] += 1
+        with partial_ph.container():
+            render_partial(p, key=f"partial_{n[0]}")
+    return on_partial
+
+def run_pipeline(url: str, brand_override: str, num_prompts: int, use_browser: bool,
+                 log, prog, on_run=None, on_partial=None,
+                 crawl_pages: int = CRAWL_PAGES, refresh_ai: bool = False,
+                 country: str = "US", answer_ttl_h: float = ANSWER_TTL_H,
+                 compare: list = ()) -> tuple[dict,dict]:
+    """Steps A–D with plain callbacks — shared by the UI and background workers.
+    `on_run(run_id)` is called once Step A is checkpointed (at the start
+    when speculating). `compare` brands are scored from the same browser run."""
+    params = {"num_prompts": num_prompts, "use_browser": use_browser,
+              "crawl_pages": crawl_pages, "refresh_ai": refresh_ai,
+              "country": country, "answer_ttl_h": answer_ttl_h,
+              "compare": [list(c) for c in compare]}
+    live   = use_browser and HAS_PLAYWRIGHT and QUERY_MODE == "local"
+    if live and SPECULATE:
+        return _speculative_pipeline(url, brand_override, num_prompts, log, prog, params,
+                                     on_run, on_partial)
 
     # ── Step A ──
     prog(0.02)
     log("━━━ STEP A: Site Intelligence ━━━")
-    intel = analyze_site(url, brand_override, num_prompts, log)
+    stream = STREAM_PROMPTS and HAS_BEDROCK and live
+    intel = analyze_site(url, brand_override, num_prompts, log, crawl_pages, refresh_ai,
+                         stream_prompts=stream)
+    prog(0.08)
+
+    run_id = new_run_id()
+    save_run(run_id, url, intel, params)
+    if on_run:
+        on_run(run_id)
+    make_prompts = (lambda feed, log: generate_prompts_into(feed, intel, num_prompts, log,
+                                                            refresh_ai)) if stream else None
+    return _query_and_score(run_id, intel, use_browser, log, prog, on_partial=on_partial,
+                            make_prompts=make_prompts, num_prompts=num_prompts,
+                            answers=run_answer_cache(params), compare=params["compare"])
+
+def _speculative_pipeline(url: str, brand_override: str, num_prompts: int, log, prog,
+                          params: dict, on_run=None, on_partial=None) -> tuple[dict,dict]:
+    """Steps A and B overlapped: browser contexts open and the brand-only
+    speculative prompts are queried while the site is crawled and analysed;
+    Step A then streams the real prompts into the same feed, where the
+    speculative ones count toward the prompt total (generate_prompts_into)."""
+    domain = extract_domain(url)
+    brand  = brand_override.strip() or brand_from_domain(domain)
+    intel  = {"brand": brand, "domain": domain, "tagline": "", "category": "",
+              "products": [], "topics": [], "competitors": [], "target_audience": "",
+              "prompts": []}
+    run_id = new_run_id()
+    save_run(run_id, url, intel, params)
+    if on_run:
+        on_run(run_id)
+    spec = speculative_prompts(brand)
+    log(f"⚡ Speculative start — warming browsers and querying {len(spec)} branded "
+        f"prompts while the site is analysed")
+    prog(0.02)
+
+    def make_prompts(feed: PromptFeed, log):
+        for p in spec:
+            feed.put(p)
+        log("━━━ STEP A: Site Intelligence ━━━")
+        try:
+            intel.update(analyze_site(url, brand_override, num_prompts, log,
+                                      params["crawl_pages"], params["refresh_ai"],
+                                      stream_prompts=True))
+        except Exception as e:
+            log(f"⚠️  Site analysis failed ({e}) — continuing with template prompts")
+        add_compare_competitors(intel, params["compare"])
+        update_run_intel(run_id, intel)
+        return generate_prompts_into(feed, intel, num_prompts, log, params["refresh_ai"],
+                                     speculative=spec)
+
+    return _query_and_score(run_id, intel, True, log, prog, on_partial=on_partial,
+                            make_prompts=make_prompts, num_prompts=num_prompts,
+                            answers=run_answer_cache(params), compare=params["compare"])
+
+def resume_analysis(run_id: str, log_lines: list, progress_ph, status_ph,
+                    partial_ph=None) -> tuple[dict,dict]:
+    """Finish a checkpointed run: skip (model, prompt) cells already saved,
+    query only what is missing, then parse and score everything."""
+    log, prog = _ui_callbacks(log_lines, progress_ph, status_ph)
+    run = load_run(run_id)
+    if not run:
+        raise ValueError(f"Unknown run id {run_id}")
+    log(f"━━━ RESUMING RUN {run_id} ━━━")
+    return _query_and_score(run_id, run["intel"], run["params"].get("use_browser", True),
+                            log, prog, saved=load_raw_results(run_id),
+                            on_partial=_partial_renderer(partial_ph),
+                            answers=run_answer_cache(run["params"]),
+                            compare=run["params"].get("compare", ()))
+
+def _query_and_score(run_id: str, intel: dict, use_browser: bool, log, prog,
+                     saved: list = (), on_partial=None,
+                     make_prompts=None, num_prompts: int = 0,
+                     answers: AnswerCache | None = None,
+                     compare: list = ()) -> tuple[dict,dict]:
+    """Steps B–D for one run; live results are checkpointed under `run_id`.
+    Each live result is parsed as it lands; `on_partial(summary)` receives a
+    running score at most every PARTIAL_EVERY_S seconds. With
+    `make_prompts(feed, log)` the prompt list is produced during Step B and
+    providers start on each prompt as soon as it exists. `compare` lists
+    extra [brand, domain] pairs scored from the same raw results into
+    metrics["brands"]."""
+    if compare:
+        add_compare_competitors(intel, compare)
     brand       = intel["brand"]
     domain      = intel["domain"]
     prompts     = intel["prompts"]
     competitors = intel["competitors"]
-    prog(0.08)
+    if not prompts and not make_prompts:
+        # Interrupted while prompts were still streaming — recover what was asked
+        prompts = intel["prompts"] = list(dict.fromkeys(r["prompt"] for r in saved)) or \
+            generate_prompts_template(brand, domain, intel.get("topics", []), competitors,
+                                      num_prompts or 12)
+
+    parsed_by_cell, raw_by_cell = {}, {}
+    running        = MetricsAccumulator()
+    last_partial   = {"t": 0.0}
+    def retag():
+        # Speculative start: rows that landed before Step A finished carry the
+        # empty competitor list — re-tag, re-checkpoint and re-score them
+        nonlocal running
+        comps = intel["competitors"]
+        for key, r in raw_by_cell.items():
+            if r.get("competitors") != comps:
+                r["competitors"] = comps
+                save_raw_result(run_id, r)
+                parsed_by_cell[key] = parse_one(r)
+        running = MetricsAccumulator()
+        for p in parsed_by_cell.values():
+            running.add(p)
+
+    def on_result(res: dict):
+        key = (res["model"], res["prompt"])
+        if key in parsed_by_cell:
+            return
+        if make_prompts and res.get("competitors") != intel["competitors"]:
+            if any(r.get("competitors") != intel["competitors"] for r in raw_by_cell.values()):
+                retag()
+            res["competitors"] = intel["competitors"]
+            save_raw_result(run_id, res)
+        raw_by_cell[key] = res
+        parsed_by_cell[key] = parse_one(res)
+        running.add(parsed_by_cell[key])
+        if on_partial and time.time() - last_partial["t"] >= PARTIAL_EVERY_S:
+            last_partial["t"] = time.time()
+            on_partial(partial_summary(running.snapshot()))
 
     # ── Step B ──
     raw_results = []
@@ -1902,23 +4537,65 @@ def run_analysis(url: str, brand_override: str, num_prompts: int,
 
     if use_browser and HAS_PLAYWRIGHT:
         log("🌐 Live browser mode — querying real AI UIs ...")
-        log(f"⚠️  This takes ~{len(prompts)*3//6 + 3}–{len(prompts)*3//4 + 5} minutes. Please wait.")
+        n = len(prompts) or num_prompts
+        log(f"⚠️  This takes ~{n//2 + 1}–{n*3//4 + 2} minutes "
+            f"(providers run concurrently). Please wait.")
+        skip = resumable_cells(saved)
+        kept = [r for r in saved if (r["model"], r["prompt"]) in skip]
+        for r in kept:
+            on_result(r)
+        feed, producing = (PromptFeed(num_prompts) if make_prompts else None), []
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            raw_results = loop.run_until_complete(
-                run_live_queries(prompts, brand, domain, competitors, prog, log)
-            )
-            loop.close()
+            if QUERY_MODE == "distributed":
+                raw_results = run_distributed_queries(
+                    run_id, prompts, brand, domain, competitors, prog, log, skip,
+                    on_result=on_result, answers=answers)
+                kept = []   # already part of the run's checkpoint
+            else:
+                pool = get_browser_pool()
+                async def step_b(progress_cb, log, on_result):
+                    producer = None
+                    if feed is not None:
+                        producing.append(1)
+                        producer = asyncio.ensure_future(asyncio.to_thread(make_prompts, feed, log))
+                    try:
+                        return await run_live_queries(
+                            prompts if feed is None else feed, brand, domain, competitors,
+                            progress_cb, log, pool=pool, limiters=get_rate_limiters(), run_id=run_id,
+                            skip=skip, on_result=on_result, answers=answers)
+                    finally:
+                        if producer:
+                            await producer
+                raw_results = pool.run(step_b, progress_cb=prog, log=log, on_result=on_result)
         except Exception as e:
             log(f"❌ Live query error: {e}")
             raw_results = []
+        if feed is not None:
+            if not producing:
+                make_prompts(feed, log)     # Step B never started
+            prompts = intel["prompts"] = feed.wait()
+            update_run_intel(run_id, intel)
+            # Re-tag any row still carrying pre-Step-A competitors so Step C
+            # parses it like every other cell
+            competitors = intel["competitors"]
+            for r in raw_results:
+                if r.get("competitors") != competitors:
+                    r["competitors"] = competitors
+                    parsed_by_cell.pop((r["model"], r["prompt"]), None)
+                    save_raw_result(run_id, r)
+        if kept or QUERY_MODE == "distributed":
+            m_order = {m: i for i, (m, _) in enumerate(QUERY_FNS)}
+            p_order = {p: i for i, p in enumerate(prompts)}
+            raw_results = sorted(kept + raw_results,
+                                 key=lambda r: (m_order.get(r["model"], 99),
+                                                p_order.get(r["prompt"], 999)))
 
         # Only fall back to mock if we got ZERO results at all
         live_ok = [r for r in raw_results if r.get("response") and len(r.get("response","")) > 50]
         if not live_ok:
             log("⚠️  All live queries returned empty — falling back to mock mode")
             raw_results = []
+            parsed_by_cell.clear()
         else:
             log(f"✅ Got {len(live_ok)} real responses from live browser scraping")
     else:
@@ -1938,19 +4615,163 @@ def run_analysis(url: str, brand_override: str, num_prompts: int,
 
     # ── Step C ──
     log("━━━ STEP C: Parsing & Sentiment ━━━")
-    parsed = [parse_one(r) for r in raw_results]
+    parsed = [parsed_by_cell.get((r["model"], r["prompt"])) or parse_one(r)
+              for r in raw_results]
     prog(0.88)
 
     # ── Step D ──
     log("━━━ STEP D: Scoring ━━━")
     metrics = compute_metrics(parsed)
+    brands  = [[brand, domain]] + [[b, d] for b, d in compare if b.lower() != brand.lower()]
+    if len(brands) > 1:
+        neutral = set(unbranded_prompts(prompts, brands))
+        rows    = [i for i, r in enumerate(raw_results) if r["prompt"] in neutral]
+        if rows:
+            multi = compute_multi_brand([raw_results[i] for i in rows], brands,
+                                        [parsed[i] for i in rows])
+            metrics["brands"] = {b: brand_summary(m) for b, m in multi.items()}
+            log(f"⚖️ Scored {len(brands)} brands from {len(rows)} shared responses "
+                f"to {len(neutral)} unbranded prompts")
+        else:
+            log("⚠️  Every prompt names a brand — skipping the brand comparison")
     prog(1.0)
 
+    set_run_status(run_id, "done")
     emoji, _, label = score_band(metrics["score"])
     log(f"✅ Done! Score: {metrics['score']:.0f}/100 ({emoji} {label})")
     return metrics, intel
 
 
+# ╔══════════════════════════════════════════════════════════════╗
+# ║  BACKGROUND JOBS                                             ║
+# ║  UI submits → worker processes (python app.py --worker) run  ║
+# ╚══════════════════════════════════════════════════════════════╝
+WORKER_COUNT      = int(os.environ.get("AICLAW_WORKERS", "2"))
+CELL_WORKER_COUNT = int(os.environ.get("AICLAW_CELL_WORKERS", "1"))   # local, distributed mode
+JOB_STALE_S      = 600      # running job with no heartbeat this long is re-queued
+JOB_FLUSH_S      = 1.0      # min seconds between progress writes
+WORKER_LOG       = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "workers.log")
+
+def _orphaned() -> bool:
+    """True once the UI process that spawned this worker (ensure_workers) has
+    exited. Workers started by hand have no parent to watch."""
+    parent = os.environ.get("AICLAW_PARENT_PID")
+    return bool(parent) and os.getppid() != int(parent)
+
+def _job_worker_loop(worker_id: str, poll_s: float, once: bool):
+    while True:
+        if _orphaned():
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {worker_id} parent gone — exiting",
+                  flush=True)
+            return
+        job = claim_job(worker_id, JOB_STALE_S)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_s)
+            continue
+        _run_job(job)
+        if once:
+            return
+
+def _run_job(job: dict):
+    jid, p = job["id"], job["params"]
+    lines, last = list(job.get("log") or []), {"t": 0.0, "p": 0.0}
+
+    def flush(force=False):
+        if force or time.time() - last["t"] >= JOB_FLUSH_S:
+            last["t"] = time.time()
+            update_job(jid, progress=last["p"], log=lines[-200:])
+
+    def log(msg: str):
+        lines.append(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
+        flush()
+
+    def prog(v: float):
+        last["p"] = min(v, 1.0)
+        flush()
+
+    try:
+        if job.get("run_id"):
+            # Re-claimed after a worker died — pick up from the checkpoint
+            run = load_run(job["run_id"])
+            log(f"━━━ RESUMING RUN {job['run_id']} ━━━")
+            metrics, intel = _query_and_score(
+                job["run_id"], run["intel"], p.get("use_browser", True), log, prog,
+                saved=load_raw_results(job["run_id"]),
+                on_partial=lambda s: update_job(jid, partial=s),
+                answers=run_answer_cache(run["params"]),
+                compare=run["params"].get("compare", ()))
+        else:
+            metrics, intel = run_pipeline(
+                p["url"], p.get("brand", ""), p.get("num_prompts", 12),
+                p.get("use_browser", True), log, prog,
+                on_run=lambda rid: update_job(jid, run_id=rid),
+                on_partial=lambda s: update_job(jid, partial=s),
+                crawl_pages=p.get("crawl_pages", CRAWL_PAGES),
+                refresh_ai=p.get("refresh_ai", False),
+                country=p.get("country", "US"),
+                answer_ttl_h=p.get("answer_ttl_h", ANSWER_TTL_H),
+                compare=p.get("compare", ()))
+        save_analysis(p["url"], metrics["brand"], metrics["score"],
+                      {"metrics": metrics, "intel": intel})
+        flush(force=True)
+        finish_job(jid, {"metrics": metrics, "intel": intel})
+    except Exception as e:
+        log(f"❌ Analysis failed: {e}")
+        flush(force=True)
+        finish_job(jid, None, error=traceback.format_exc())
+        print(f"job #{jid} failed:\n{traceback.format_exc()}", file=sys.stderr, flush=True)
+
+def run_worker(worker_id: str | None = None, poll_s: float = 2.0, once: bool = False):
+    """Worker process entry point: claim queued jobs and run Steps A–D."""
+    init_db()
+    worker_id = worker_id or f"{os.uname().nodename}:{os.getpid()}"
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {worker_id} job worker started", flush=True)
+    _job_worker_loop(worker_id, poll_s, once)
+
+
+@st.cache_resource(show_spinner=False)
+def _worker_procs() -> list:
+    return []
+
+def ensure_workers(n: int = WORKER_COUNT, cell_workers: int = CELL_WORKER_COUNT) -> int:
+    """Keep `n` local job workers (plus `cell_workers` cell workers in
+    distributed mode) alive; returns how many job workers are running.
+    Workers write to WORKER_LOG and exit once this process is gone."""
+    procs = _worker_procs()
+    procs[:] = [(kind, p) for kind, p in procs if p.poll() is None]
+    want = {"--worker": n, "--cell-worker": cell_workers if QUERY_MODE == "distributed" else 0}
+    env  = {**os.environ, "AICLAW_PARENT_PID": str(os.getpid())}
+    for kind, count in want.items():
+        while sum(1 for k, _ in procs if k == kind) < count:
+            try:
+                with open(WORKER_LOG, "a") as out:
+                    procs.append((kind, subprocess.Popen(
+                        [sys.executable, os.path.abspath(__file__), kind],
+                        stdout=out, stderr=subprocess.STDOUT, env=env,
+                        start_new_session=True,
+                    )))
+            except Exception:
+                break
+    return sum(1 for k, _ in procs if k == "--worker")
+
+def render_job(job: dict):
+    """Progress view for a queued/running job."""
+    status = job["status"]
+    label  = {"queued": "⏳ Queued — waiting for a worker",
+              "running": "🔄 Analysis in progress ..."}.get(status, status)
+    st.markdown(f"### {label}")
+    st.progress(min(job.get("progress") or 0.0, 1.0))
+    if job.get("partial"):
+        render_partial(job["partial"])
+    html = "<br>".join((job.get("log") or [])[-22:])
+    if html:
+        st.markdown(f'<div class="log-box">{html}</div>', unsafe_allow_html=True)
+    st.caption(f"Job #{job['id']} · worker {job.get('worker') or '—'} · "
+               "safe to close this tab; the result is saved to Previous Analyses.")
+
+
 # ╔══════════════════════════════════════════════════════════════╗
 # ║  MAIN UI                                                     ║
 # ╚══════════════════════════════════════════════════════════════╝
@@ -1994,7 +4815,22 @@ def main():
             list(COUNTRIES.keys()),
             format_func=lambda k: f"{k} — {COUNTRIES[k]}",
         )
+        compare = parse_compare_brands(st.text_area(
+            "⚖️ Compare brands",
+            placeholder="Acme — acme.com\nglobex.com",
+            help="One brand per line (\"Brand — domain\", or just a domain). Every brand is "
+                 "scored from the same browser run — no extra queries.",
+        ))
         num_prompts = st.slider("📝 Prompts per model", 5, 20, 12)
+        crawl_pages = st.slider("🕸️ Pages to crawl", 1, 12, CRAWL_PAGES,
+                                help="Internal pages fetched after the homepage")
+        answer_ttl_h = st.slider("♻️ Reuse provider answers younger than (hours)", 0, 168,
+                                 int(ANSWER_TTL_H),
+                                 help="Category prompts already asked for another brand in this "
+                                      "country are answered from the cache instead of the "
+                                      "browser. 0 always queries live.")
+        refresh_ai = st.checkbox("♻️ Refresh cached AI site analysis", value=False,
+                                 help="Bypass the Bedrock response cache for this run")
 
         st.markdown("---")
         st.markdown("#### 🤖 Query Mode")
@@ -2012,16 +4848,24 @@ def main():
             disabled=not browser_ok,
             help=browser_help,
         )
+        use_worker = st.toggle(
+            "🧵 Run in background worker",
+            value=True,
+            help="Queue the analysis for a worker process. The page stays responsive, "
+                 "reruns don't kill the run, and several analyses can run at once.",
+        )
 
         if use_browser:
+            if not use_worker:
+                get_browser_pool()   # warm Chromium now so the first run starts instantly
             st.success("🟢 Live mode — real AI browser queries")
             with st.expander("ℹ️ Live mode notes"):
                 st.markdown("""
                 - **ChatGPT** — ⛔ SKIPPED (Cloudflare blocks headless browsers)
                 - **Gemini** — may require Google login; will be marked if blocked
-                - **Claude** — ProseMirror editor; uses `[data-testid="chat-input"]` selector
+                - **Claude** — ProseMirror editor; selectors self-tune (override in `providers.json`)
                 - Runs headless Chromium; each prompt takes 30–60 seconds
-                - Total time: ~3–10 minutes (2 models x prompt count)
+                - Providers run concurrently in one browser — total time ≈ slowest provider
                 - Login-wall results are flagged; score computed on available data
                 """)
         else:
@@ -2052,24 +4896,52 @@ def main():
         else:
             st.caption("No saved analyses yet")
 
+        resume_id = None
+        resumable = load_resumable_runs(5)
+        if resumable:
+            st.markdown("#### ♻️ Interrupted Runs")
+            ropts = {f"[{row[1][:16]}] {row[2]} — {row[3]} cells saved": row[0] for row in resumable}
+            rsel = st.selectbox("Resume", list(ropts.keys()))
+            if st.button("♻️ Resume run"):
+                resume_id = ropts[rsel]
+
     # ── Run ───────────────────────────────────────────────────────────────────
-    if run_btn:
-        if not url.strip():
+    if run_btn or resume_id:
+        if run_btn and not url.strip():
             st.error("❌ Please enter a website URL"); st.stop()
         st.session_state.pop("metrics", None)
         st.session_state.pop("intel",   None)
 
+        if use_worker and not resume_id:
+            job_id = submit_job({"url": url.strip(), "brand": brand_input.strip(),
+                                 "num_prompts": num_prompts, "use_browser": use_browser,
+                                 "crawl_pages": crawl_pages, "refresh_ai": refresh_ai,
+                                 "country": country, "answer_ttl_h": answer_ttl_h,
+                                 "compare": compare})
+            if job_id and (ensure_workers() > 0 or not cancel_job(job_id)):
+                st.session_state["job_id"] = job_id     # queued, or a worker elsewhere took it
+                st.rerun()
+            st.warning("⚠️ Background workers unavailable — running in this session")
+
         st.markdown("### 🔄 Analysis in progress ...")
         prog_ph   = st.progress(0)
+        partial_ph = st.empty()
         status_ph = st.empty()
         log_lines = []
 
         with st.spinner(""):
             try:
-                metrics, intel = run_analysis(
-                    url.strip(), brand_input.strip(), num_prompts,
-                    use_browser, log_lines, prog_ph, status_ph
-                )
+                if resume_id:
+                    metrics, intel = resume_analysis(resume_id, log_lines, prog_ph, status_ph,
+                                                     partial_ph)
+                    url = (load_run(resume_id) or {}).get("url", url)
+                else:
+                    metrics, intel = run_analysis(
+                        url.strip(), brand_input.strip(), num_prompts,
+                        use_browser, log_lines, prog_ph, status_ph, partial_ph,
+                        crawl_pages=crawl_pages, refresh_ai=refresh_ai,
+                        country=country, answer_ttl_h=answer_ttl_h, compare=compare
+                    )
                 st.session_state["metrics"] = metrics
                 st.session_state["intel"]   = intel
                 save_analysis(url, metrics["brand"], metrics["score"],
@@ -2083,6 +4955,28 @@ def main():
                 st.error(f"❌ Analysis failed: {e}")
                 st.code(traceback.format_exc())
 
+    # ── Background job ────────────────────────────────────────────────────────
+    job_id = st.session_state.get("job_id")
+    if job_id:
+        job = load_job(job_id)
+        if job is None:
+            st.session_state.pop("job_id", None)
+        elif job["status"] == "done":
+            st.session_state.pop("job_id", None)
+            st.session_state["metrics"] = job["result"]["metrics"]
+            st.session_state["intel"]   = job["result"]["intel"]
+            if job["result"]["metrics"]["score"] > 70:
+                st.balloons()
+        elif job["status"] == "failed":
+            st.session_state.pop("job_id", None)
+            st.error("❌ Analysis failed")
+            st.code(job["error"] or "")
+        else:
+            render_job(job)
+            ensure_workers()
+            time.sleep(2)
+            st.rerun()
+
     # ── Results ───────────────────────────────────────────────────────────────
     metrics = st.session_state.get("metrics")
     intel   = st.session_state.get("intel")
@@ -2099,20 +4993,23 @@ def main():
                     st.markdown(f"**{i}.** {p}")
 
         # Tabs
-        t1,t2,t3,t4,t5,t6 = st.tabs([
-            "📊 Executive Summary",
-            "🤖 Per-Model Deep Dive",
-            "🔗 Sources & Citations",
-            "🚀 Traffic & Visits",
-            "💡 Recommendations",
-            "📋 Raw Data",
-        ])
-        with t1: tab_executive(metrics)
-        with t2: tab_per_model(metrics)
-        with t3: tab_sources(metrics)
-        with t4: tab_traffic(metrics)
-        with t5: tab_recommendations(metrics)
-        with t6: tab_raw(metrics)
+        labels = ["📊 Executive Summary",
+                  "🤖 Per-Model Deep Dive",
+                  "🔗 Sources & Citations",
+                  "🚀 Traffic & Visits",
+                  "💡 Recommendations",
+                  "📋 Raw Data"]
+        if metrics.get("brands"):
+            labels.insert(1, "⚖️ Brand Comparison")
+        tabs = iter(st.tabs(labels))
+        with next(tabs): tab_executive(metrics)
+        if metrics.get("brands"):
+            with next(tabs): tab_compare(metrics)
+        with next(tabs): tab_per_model(metrics)
+        with next(tabs): tab_sources(metrics)
+        with next(tabs): tab_traffic(metrics)
+        with next(tabs): tab_recommendations(metrics)
+        with next(tabs): tab_raw(metrics)
 
     else:
         # Welcome / empty state
@@ -2150,4 +5047,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if "--worker" in sys.argv:
+        run_worker()
+    elif "--cell-worker" in sys.argv:
+        run_cell_worker()
+    else:
+        main()
@@ -0,0 +1,51 @@
+"""Compare BeautifulSoup link collection against app._internal_links().
+
+    python bench_links.py DIR [LIMIT]
+
+Runs both over every saved *.html page under DIR and prints the best of
+five timings for each. Needs beautifulsoup4, which the app itself does not.
+"""
+import glob
+import os
+import sys
+import time
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from app import HOME_LINK_LIMIT, _fmt_bytes, _internal_links, extract_domain
+
+
+def bench_links(folder: str, limit: int = HOME_LINK_LIMIT, repeat: int = 5):
+    files = sorted(glob.glob(os.path.join(folder, "**", "*.htm*"), recursive=True))
+    if not files:
+        print(f"no .html files under {folder}"); return
+    pages = [open(f, encoding="utf-8", errors="replace").read() for f in files]
+    url = "https://example.com/"
+
+    def with_soup(html):
+        soup, links = BeautifulSoup(html, "html.parser"), []
+        for a in soup.find_all("a", href=True):
+            full = urljoin(url, a["href"])
+            if extract_domain(full) == "example.com" and full not in links \
+                    and full != url and "?" not in full:
+                links.append(full)
+            if len(links) >= limit:
+                break
+        return links
+
+    for name, fn in (("beautifulsoup", with_soup),
+                     ("streaming", lambda h: _internal_links(h, url, limit))):
+        best, n = float("inf"), 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            n = sum(len(fn(h)) for h in pages)
+            best = min(best, time.perf_counter() - t0)
+        print(f"{name:>14}: {best*1000:8.1f} ms for {len(pages)} pages "
+              f"({_fmt_bytes(sum(map(len, pages)))}), {n} links")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    bench_links(sys.argv[1], *(int(a) for a in sys.argv[2:3]))
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AICLAW_DB", os.path.join(tempfile.mkdtemp(), "analyses.db"))
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+
+import app as _app  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app module with a fresh SQLite database."""
+    monkeypatch.setattr(_app, "DB_PATH", str(tmp_path / "analyses.db"))
+    _app.init_db()
+    return _app
+
+
+@pytest.fixture
+def stub_server():
+    """Start a local HTTP server; `respond(handler)` is called for each POST
+    with the BaseHTTPRequestHandler. Yields (start, requests)."""
+    servers, requests = [], []
+
+    def start(respond) -> str:
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("content-length") or 0))
+                requests.append((self.path, body))
+                respond(self)
+
+            def log_message(self, *a):
+                pass
+
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return f"http://127.0.0.1:{srv.server_port}"
+
+    yield start, requests
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def send_json(handler, status: int, body: bytes, headers: dict | None = None):
+    handler.send_response(status)
+    handler.send_header("content-type", "application/json")
+    handler.send_header("content-length", str(len(body)))
+    for k, v in (headers or {}).items():
+        handler.send_header(k, v)
+    handler.end_headers()
+    handler.wfile.write(body)
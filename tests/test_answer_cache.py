@@ -0,0 +1,76 @@
+LONG = "Acme and Globex are both solid analytics picks for mid-size teams in 2025."
+
+
+def _answer(model, prompt):
+    return {"model": model, "prompt": prompt, "response": LONG, "sources": [],
+            "mock": False, "error": None, "brand": "Globex", "domain": "globex.com",
+            "competitors": ["Acme"], "timing": {"completion_ms": 4200},
+            "selectors": {"input": "textarea"}}
+
+
+def test_cached_answers_drop_run_fields_and_take_the_new_brand(app):
+    cache = app.AnswerCache("US", ttl_h=1)
+    cache.put(_answer("Gemini", "Best analytics tools?"))
+    hit = cache.get("Gemini", "best analytics tools", "Acme", "acme.com", ["Globex"])
+    assert hit["response"] == LONG
+    assert (hit["brand"], hit["domain"], hit["competitors"]) == ("Acme", "acme.com", ["Globex"])
+    assert "timing" not in hit and "selectors" not in hit
+    assert hit["answer_cache_age_s"] >= 0
+    assert app.completion_timings([hit]) == {}       # cache hits don't skew the stats
+
+
+def _run(app, prompts, answers):
+    opened, queried, seen = [], [], []
+
+    async def open_context():
+        opened.append(object())
+        return opened[-1]
+
+    async def close_context(ctx):
+        opened.remove(ctx)
+
+    async def query_fn(ctx, prompt):
+        queried.append(prompt)
+        return {"model": "Gemini", "prompt": prompt, "response": LONG, "sources": [],
+                "mock": False, "error": None}
+
+    async def on_result(res):
+        seen.append(res)
+
+    limiter = app.ProviderLimiter("Gemini", rate=50, max_rate=50, jitter=0)
+    out = app.asyncio.run(app._run_provider_guarded(
+        open_context, close_context, "Gemini", query_fn, prompts, "Acme", "acme.com", [],
+        lambda: None, lambda m: None, {}, limiter, on_result, answers))
+    return out, opened, queried, seen
+
+
+def test_all_cached_prompts_never_open_a_browser(app):
+    answers = app.AnswerCache("US", ttl_h=1)
+    for p in ("p one", "p two"):
+        answers.put(_answer("Gemini", p))
+    out, opened, queried, seen = _run(app, ["p one", "p two"], answers)
+    assert queried == [] and len(out) == len(seen) == 2
+    assert opened == []
+
+
+def test_context_opens_on_first_miss_and_launch_failure_keeps_hits(app):
+    answers = app.AnswerCache("US", ttl_h=1)
+    answers.put(_answer("Gemini", "cached"))
+    out, opened, queried, _ = _run(app, ["cached", "fresh"], answers)
+    assert queried == ["fresh"] and len(out) == 2
+    assert opened == []                               # closed again afterwards
+
+    async def broken():
+        raise RuntimeError("no chromium")
+
+    seen = []
+
+    async def on_result(res):
+        seen.append(res)
+
+    limiter = app.ProviderLimiter("Gemini", rate=50, max_rate=50, jitter=0)
+    out = app.asyncio.run(app._run_provider_guarded(
+        broken, None, "Gemini", None, ["cached", "other"], "Acme", "acme.com", [],
+        lambda: None, lambda m: None, {}, limiter, on_result, answers))
+    assert [r["error"] for r in out] == [None, "no chromium"]
+    assert out[0]["response"] == LONG and len(seen) == 2
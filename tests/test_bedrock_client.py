@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from conftest import send_json
+
+OK = json.dumps({"content": [{"text": '["a prompt", "another prompt", "a third prompt"]'}]}).encode()
+
+
+def throttled(handler):
+    send_json(handler, 429, b'{"message": "Too many requests"}',
+              {"x-amzn-ErrorType": "ThrottlingException"})
+
+
+def test_retries_throttling_with_backoff(app, stub_server):
+    start, requests = stub_server
+    replies = [throttled, throttled, lambda h: send_json(h, 200, OK)]
+    url = start(lambda h: replies.pop(0)(h))
+    client = app.BedrockClient(endpoint_url=url)
+
+    t0 = time.monotonic()
+    out = client.invoke(app.BEDROCK_MODEL_ID, app.bedrock_body("hi", 10))
+    elapsed = time.monotonic() - t0
+
+    assert out["content"][0]["text"].startswith("[")
+    assert len(requests) == 3                   # two throttles retried by botocore
+    assert elapsed > 0.05                       # retries were backed off, not immediate
+    stats = client.stats()
+    assert stats["calls"] == 1 and stats["errors"] == 0
+    assert client.last_error is None
+
+
+def test_gives_up_and_counts_errors(app, stub_server):
+    start, requests = stub_server
+    url = start(lambda h: send_json(h, 400, b'{"message": "bad body"}',
+                                    {"x-amzn-ErrorType": "ValidationException"}))
+    client = app.BedrockClient(endpoint_url=url)
+
+    with pytest.raises(ClientError):
+        client.invoke(app.BEDROCK_MODEL_ID, "{}")
+
+    assert len(requests) == 1                   # client errors are not retried
+    stats = client.stats()
+    assert stats["calls"] == 1 and stats["errors"] == 1
+    assert stats["error_types"] == {"ValidationException": 1}
+    assert client.last_error.startswith("ValidationException")
+
+
+def test_concurrency_cap(app, stub_server):
+    start, _ = stub_server
+    live, peak, lock = [0], [0], threading.Lock()
+
+    def slow(h):
+        with lock:
+            live[0] += 1
+            peak[0] = max(peak[0], live[0])
+        time.sleep(0.1)
+        with lock:
+            live[0] -= 1
+        send_json(h, 200, OK)
+
+    client = app.BedrockClient(endpoint_url=start(slow), concurrency=2)
+    threads = [threading.Thread(target=client.invoke, args=(app.BEDROCK_MODEL_ID, "{}"))
+               for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak[0] == 2
+    assert client.stats()["calls"] == 6
+
+
+def test_bedrock_json_uses_response_cache(app, stub_server, monkeypatch):
+    start, requests = stub_server
+    client = app.BedrockClient(endpoint_url=start(lambda h: send_json(h, 200, OK)))
+    monkeypatch.setattr(app, "get_bedrock", lambda: client)
+    parse = lambda t: app._parse_prompt_list(t, 3)
+
+    first  = app.bedrock_json("prompts please", 100, parse)
+    second = app.bedrock_json("prompts please", 100, parse)
+    assert first == second == ["a prompt", "another prompt", "a third prompt"]
+    assert len(requests) == 1                   # second answer came from bedrock_cache
+
+    app.bedrock_json("prompts please", 100, parse, refresh=True)
+    assert len(requests) == 2                   # refresh bypasses the cache
+    app.bedrock_json("something else", 100, parse)
+    assert len(requests) == 3                   # different body, different key
+    assert client.stats()["calls"] == 3
+
+
+def test_unparseable_response_is_not_cached(app, stub_server, monkeypatch):
+    start, requests = stub_server
+    bad = json.dumps({"content": [{"text": "sorry, no JSON today"}]}).encode()
+    client = app.BedrockClient(endpoint_url=start(lambda h: send_json(h, 200, bad)))
+    monkeypatch.setattr(app, "get_bedrock", lambda: client)
+    parse = lambda t: app._parse_prompt_list(t, 3)
+
+    assert app.bedrock_json("x", 100, parse) is None
+    assert app.bedrock_json("x", 100, parse) is None
+    assert len(requests) == 2
@@ -0,0 +1,50 @@
+import pytest
+
+
+def test_prompt_shingles_fold_synonyms_and_filler(app):
+    a = app._prompt_shingles("best email marketing software recommendations 2025")
+    b = app._prompt_shingles("top rated email marketing tools experts recommend 2025")
+    assert a == {"email", "marketing", "tool", "recommend"}
+    assert b == a | {"experts"}
+    assert app._prompt_shingles("Acme vs HubSpot") == \
+        app._prompt_shingles("which is better Acme or HubSpot")
+    assert app._prompt_shingles("CRM platforms") == app._prompt_shingles("crm solutions")
+
+
+@pytest.mark.parametrize("threshold, kept", [
+    (0.7, ["best email marketing software recommendations 2025", "Acme pricing"]),
+    (0.9, ["best email marketing software recommendations 2025",
+           "top rated email marketing tools experts recommend 2025", "Acme pricing"]),
+])
+def test_dedupe_threshold(app, threshold, kept):
+    prompts = ["best email marketing software recommendations 2025",
+               "top rated email marketing tools experts recommend 2025",   # Jaccard 0.8
+               "Acme pricing"]
+    got, dropped = app.dedupe_prompts(prompts, 10, threshold=threshold)
+    assert got == kept
+    assert dropped == [p for p in prompts if p not in kept]
+
+
+def test_dedupe_first_wins_and_caps_at_n(app):
+    got, dropped = app.dedupe_prompts(["Acme vs HubSpot", "which is better Acme or HubSpot",
+                                       "Acme pricing", "Acme security"], 2)
+    assert got == ["Acme vs HubSpot", "Acme pricing"]
+    assert dropped == ["which is better Acme or HubSpot"]
+
+
+def test_top_up_takes_least_similar_first(app):
+    kept = ["best crm tools for startups"]
+    extra = ["top crm platforms for startups 2025",     # duplicate of the kept prompt
+             "crm tools for agencies",                  # shares "crm tool"
+             "open source helpdesk alternatives",       # shares nothing
+             "crm pricing for startups"]                # shares "crm startups"
+    got, _ = app.dedupe_prompts(kept, 3, extra)
+    assert got == kept + ["open source helpdesk alternatives", "crm tools for agencies"]
+
+
+def test_template_run_keeps_num_prompts(app):
+    for topics, comps in (([], []), (["email marketing", "ecommerce brands"], ["HubSpot"])):
+        pool = app.generate_prompts_template("Acme", "acme.com", topics, comps, app.PROMPT_POOL)
+        got, dropped = app.dedupe_prompts(pool[:20], 20, pool)
+        assert dropped
+        assert len(got) == 20 == len(set(got))
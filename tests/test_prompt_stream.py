@@ -0,0 +1,159 @@
+import base64
+import json
+import struct
+import threading
+import time
+import zlib
+
+import pytest
+
+from conftest import send_json
+
+PROMPTS = ["best \"quoted\" tool", "path C:\\\\temp\\\\x, ok", "ünïcode ✓ prompt", "plain one"]
+
+
+def split_everywhere(text: str, step: int):
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 5, 7, 13])
+def test_json_array_stream_any_split(app, step):
+    text = 'Sure! Here they are:\n[ ' + ",\n ".join(json.dumps(p) for p in PROMPTS) + " ]\nDone."
+    parser, got = app.JsonArrayStream(), []
+    for piece in split_everywhere(text, step):
+        got += parser.feed(piece)
+    assert got == PROMPTS
+    assert parser.done
+
+
+def test_json_array_stream_yields_items_as_they_close(app):
+    parser = app.JsonArrayStream()
+    assert parser.feed('[ "first') == []             # string still open
+    assert parser.feed(' half", "sec') == ["first half"]
+    assert parser.feed('ond \\"') == []              # escaped quote is not the end
+    assert parser.feed('x\\"", ') == ['second "x"']
+    assert parser.feed("]") == []
+    assert parser.done
+    assert parser.feed(', "after the array"') == []
+
+
+def test_json_array_stream_skips_non_strings_and_preamble(app):
+    parser = app.JsonArrayStream()
+    assert parser.feed("Here are the prompts you asked for: ") == []
+    assert not parser.started
+    got = parser.feed('[12, "kept", nu') + parser.feed('ll, "also"]')
+    assert got == ["kept", "also"]
+    assert parser.done
+
+
+def test_prompt_feed_put_close(app):
+    feed = app.PromptFeed(expected=4, prompts=["spec a", "spec b"])
+    assert feed.put("p1") is True
+    assert feed.put("p1") is False                 # duplicates are ignored
+    assert feed.put("spec a") is False             # so are the seeded prompts
+    assert feed.snapshot() == ["spec a", "spec b", "p1"]
+    assert len(feed) == 3
+    assert feed.wait(timeout=0.05) == ["spec a", "spec b", "p1"]   # timed out, still open
+    assert not feed.closed
+    feed.close()
+    assert feed.closed
+    assert feed.put("late") is False               # closed feeds refuse new prompts
+    assert feed.wait(timeout=0.1) == ["spec a", "spec b", "p1"]
+
+
+def test_prompt_feed_streams_follow_producer_independently(app):
+    feed = app.PromptFeed(expected=3, prompts=["s1"])
+    seen = {"fast": [], "slow": []}
+
+    def producer():
+        time.sleep(0.05)
+        feed.put("p1")
+        time.sleep(3 * app.FEED_POLL_S)           # long enough for the fast consumer to catch up
+        feed.put("p2")
+        feed.close()
+
+    async def consume(name, delay):
+        async for p in feed.stream():
+            seen[name].append((p, feed.closed))
+            await app.asyncio.sleep(delay)
+
+    async def both():
+        await app.asyncio.gather(consume("fast", 0), consume("slow", 0.5))
+
+    t = threading.Thread(target=producer)
+    t.start()
+    app.asyncio.run(both())
+    t.join()
+    for name in seen:                              # every consumer sees every prompt once
+        assert [p for p, _ in seen[name]] == ["s1", "p1", "p2"]
+    assert not seen["fast"][0][1] and not seen["fast"][1][1]    # streamed before close
+    assert feed.wait(timeout=0.1) == ["s1", "p1", "p2"]
+
+
+@pytest.mark.parametrize("n", [5, 12, 20])
+def test_speculative_template_fill_reaches_n(app, monkeypatch, n):
+    monkeypatch.setattr(app, "HAS_BEDROCK", False)
+    spec = app.speculative_prompts("Acme")
+    feed, logs = app.PromptFeed(expected=n, prompts=spec), []
+    intel = {"brand": "Acme", "domain": "acme.com", "category": "analytics",
+             "topics": ["analytics", "dashboards"], "competitors": ["Globex", "Initech"]}
+    got = app.generate_prompts_into(feed, intel, n, logs.append, speculative=spec)
+    assert len(got) == n
+    assert got[:len(spec)] == spec
+    assert not any("Only" in line or "matched AI" in line for line in logs)
+
+
+# ── bedrock_stream_prompts against a stub sending AWS event-stream chunks ──
+def _header(name: str, value: str) -> bytes:
+    n, v = name.encode(), value.encode()
+    return bytes([len(n)]) + n + bytes([7]) + struct.pack(">H", len(v)) + v
+
+
+def _event(payload: bytes) -> bytes:
+    headers = (_header(":event-type", "chunk") + _header(":content-type", "application/json")
+               + _header(":message-type", "event"))
+    prelude = struct.pack(">II", 12 + len(headers) + len(payload) + 4, len(headers))
+    prelude += struct.pack(">I", zlib.crc32(prelude))
+    msg = prelude + headers + payload
+    return msg + struct.pack(">I", zlib.crc32(msg))
+
+
+def _stream_reply(text: str, step: int, gap_s: float):
+    def respond(h):
+        if not h.path.endswith("invoke-with-response-stream"):
+            return send_json(h, 404, b"{}")
+        h.send_response(200)
+        h.send_header("content-type", "application/vnd.amazon.eventstream")
+        h.send_header("transfer-encoding", "chunked")
+        h.end_headers()
+        for piece in split_everywhere(text, step):
+            delta = {"type": "content_block_delta", "index": 0,
+                     "delta": {"type": "text_delta", "text": piece}}
+            ev = _event(json.dumps({"bytes": base64.b64encode(
+                json.dumps(delta).encode()).decode()}).encode())
+            h.wfile.write(f"{len(ev):x}\r\n".encode() + ev + b"\r\n")
+            h.wfile.flush()
+            time.sleep(gap_s)
+        h.wfile.write(b"0\r\n\r\n")
+    return respond
+
+
+def test_bedrock_stream_prompts_yields_before_stream_ends(app, stub_server, monkeypatch):
+    start, requests = stub_server
+    text = "Here you go:\n" + json.dumps(PROMPTS)
+    client = app.BedrockClient(endpoint_url=start(_stream_reply(text, 7, 0.02)))
+    monkeypatch.setattr(app, "get_bedrock", lambda: client)
+    args = ("Acme", "acme.com", "", [], ["analytics"], [], 4)
+
+    t0, first_at, got = time.monotonic(), None, []
+    for p in app.bedrock_stream_prompts(*args):
+        first_at = first_at or time.monotonic() - t0
+        got.append(p)
+    total = time.monotonic() - t0
+    assert got == PROMPTS
+    assert first_at < total / 2                    # first prompt long before the last chunk
+
+    # The complete reply was cached: a repeat makes no request
+    assert list(app.bedrock_stream_prompts(*args)) == PROMPTS
+    assert len(requests) == 1
+    assert client.stats()["calls"] == 1
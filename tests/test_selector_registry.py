@@ -0,0 +1,28 @@
+import json
+
+
+def test_providers_json_overrides_single_lists(app, tmp_path, monkeypatch):
+    path = tmp_path / "providers.json"
+    monkeypatch.setattr(app, "PROVIDERS_PATH", str(path))
+    monkeypatch.setattr(app, "_REGISTRY", {"mtime": None, "data": app.DEFAULT_PROVIDERS})
+    assert app.load_provider_registry() is app.DEFAULT_PROVIDERS      # no file: defaults
+
+    path.write_text(json.dumps({"Claude": {"input": ["#composer"]}}))
+    reg = app.load_provider_registry()
+    assert reg["Claude"]["input"] == ["#composer"]
+    assert reg["Claude"]["submit"] == app.DEFAULT_PROVIDERS["Claude"]["submit"]
+    assert reg["Gemini"] == app.DEFAULT_PROVIDERS["Gemini"]
+
+    path.write_text("{not json")
+    app.os.utime(path, (1, 1))
+    assert app.load_provider_registry()["Claude"]["input"] == ["#composer"]   # last good copy
+
+
+def test_fallback_selectors_stay_last_and_unranked(app, monkeypatch):
+    monkeypatch.setattr(app, "PROVIDERS_PATH", "/nonexistent/providers.json")
+    monkeypatch.setattr(app, "_REGISTRY", {"mtime": None, "data": app.DEFAULT_PROVIDERS})
+    for _ in range(3):
+        app.record_selector_race("Gemini", "response", ["model-response", "body"], "body", 50)
+    assert app.load_selector_stats("Gemini")[("response", "model-response")][1] == 3
+    assert ("response", "body") not in app.load_selector_stats("Gemini")
+    assert app.provider_selectors("Gemini")["response"][-1] == "body"
@@ -0,0 +1,29 @@
+def _res(model, prompt):
+    return {"model": model, "prompt": prompt, "response": "ok", "sources": [], "error": None}
+
+
+def test_resume_requeues_without_stealing_live_leases(app):
+    models, prompts, ctx = ["Gemini", "Claude"], ["p1", "p2"], {"brand": "Acme"}
+    assert app.enqueue_work_items("r1", prompts, models, ctx) == 4
+    done = app.claim_work_item("w1", 60, ["Gemini"])
+    app.complete_work_item(done, _res("Gemini", done["prompt"]))
+    live = app.claim_work_item("w2", 60, ["Claude"])
+
+    # Resume: the finished cell is skipped, the live lease must survive
+    skip = {("Gemini", done["prompt"])}
+    assert app.enqueue_work_items("r1", prompts, models, ctx, skip) == 2
+    assert app.heartbeat_work_item(live, "w2", 60)
+    cells = {(m, p) for m in models for p in prompts} - skip
+    assert app.work_progress("r1", cells) == (0, 3)
+    assert app.work_progress("r1") == (1, 4)
+
+    app.complete_work_item(live, _res("Claude", live["prompt"]))
+    assert app.work_progress("r1", cells) == (1, 3)
+
+
+def test_expired_leases_are_requeued(app):
+    app.enqueue_work_items("r2", ["p"], ["Gemini"], {})
+    item = app.claim_work_item("w1", -1, ["Gemini"])       # lease already expired
+    assert app.enqueue_work_items("r2", ["p"], ["Gemini"], {}) == 1
+    assert not app.heartbeat_work_item(item, "w1", 60)     # lease was reset
+    assert app.claim_work_item("w2", 60, ["Gemini"])["attempts"] == 1
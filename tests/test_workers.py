@@ -0,0 +1,44 @@
+import time
+
+
+def test_limiters_in_separate_processes_share_one_pace(app):
+    # Two limiters for one provider stand in for two worker processes:
+    # they share nothing but the DB.
+    cfg = {"rate": 5, "max_rate": 5, "jitter": 0}
+    first, second = app.ProviderLimiter("Gemini", **cfg), app.ProviderLimiter("Gemini", **cfg)
+
+    async def both():
+        t0 = time.monotonic()
+        await first.acquire()
+        await second.acquire()
+        return time.monotonic() - t0
+
+    assert app.asyncio.run(both()) >= 0.18          # 1/rate apart, not both at once
+
+
+def test_recorded_query_holds_the_shared_slot(app):
+    cfg = {"rate": 5, "max_rate": 5, "jitter": 0}
+    first, second = app.ProviderLimiter("Claude", **cfg), app.ProviderLimiter("Claude", **cfg)
+    first.record({"response": "x" * 80})
+    first.save()
+    t0 = time.monotonic()
+    app.asyncio.run(second.acquire())
+    assert time.monotonic() - t0 >= 0.18            # gap runs from the other's completion
+
+
+def test_cancel_job_only_withdraws_unclaimed_jobs(app):
+    queued, claimed = app.submit_job({"url": "a"}), app.submit_job({"url": "b"})
+    assert app.claim_job("w1", app.JOB_STALE_S)["id"] == queued
+    assert app.cancel_job(claimed) is True
+    assert app.load_job(claimed)["status"] == "cancelled"
+    assert app.cancel_job(queued) is False          # a worker is already running it
+    assert app.claim_job("w2", app.JOB_STALE_S) is None
+
+
+def test_spawned_worker_notices_its_parent_exit(app, monkeypatch):
+    monkeypatch.delenv("AICLAW_PARENT_PID", raising=False)
+    assert not app._orphaned()                       # started by hand
+    monkeypatch.setenv("AICLAW_PARENT_PID", str(app.os.getppid()))
+    assert not app._orphaned()
+    monkeypatch.setenv("AICLAW_PARENT_PID", "1" if app.os.getppid() != 1 else "2")
+    assert app._orphaned()